@@ -0,0 +1,192 @@
+
+"""
+CEP, bairro e logradouro extraídos do endereço livre dos negócios.
+
+Os endereços do Google Maps seguem, com variações, o formato
+"R. Comendador Araújo, 143 - Loja 2 - Centro, Curitiba - PR, 80420-000".
+parse_address() separa as partes na entrada (scraper, importação, replay)
+e backfill_addresses() preenche os negócios antigos, para que filtros
+geográficos virem consultas indexadas em vez de LIKE na tabela inteira.
+
+Bairro e logradouro também são gravados como chave normalizada (sem
+acento, minúsculas, abreviações expandidas): "Água Verde" e "agua verde"
+caem no mesmo índice.
+
+Uso: python address_parser.py   (backfill dos negócios ainda não processados)
+"""
+import logging
+import re
+import unicodedata
+from sqlalchemy import bindparam, or_, update
+from models import Business, SessionLocal, init_db
+from log_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Negócios processados por lote no backfill; lotes grandes diluem a manutenção
+# dos três índices no commit
+BATCH_SIZE = 10000
+
+ADDRESS_FIELDS = ('cep', 'neighborhood', 'neighborhood_key', 'street', 'street_key')
+
+UFS = {'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA', 'PB',
+       'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'}
+
+# Abreviações de logradouro expandidas na chave ("R." e "Rua" casam)
+STREET_ABBREVIATIONS = {
+    'r': 'rua', 'av': 'avenida', 'al': 'alameda', 'tv': 'travessa', 'trav': 'travessa',
+    'pc': 'praca', 'pca': 'praca', 'rod': 'rodovia', 'estr': 'estrada', 'lgo': 'largo',
+    'lg': 'largo', 'vl': 'vila', 'bc': 'beco', 'pq': 'parque'
+}
+STREET_TYPES = set(STREET_ABBREVIATIONS.values()) | {'servidao', 'marginal', 'via', 'viela', 'ladeira', 'acesso'}
+
+# Complementos que aparecem entre o número e o bairro ("143 - Loja 2 - Centro")
+COMPLEMENT_RE = re.compile(
+    r'^(loja|lj|sala|sl|conj|conjunto|cj|apto|apt|ap|bloco|bl|andar|casa|galpao|box|km|lote|quadra|qd|piso|terreo|subsolo|s/n|sn)\b|^\d',
+    re.IGNORECASE
+)
+CEP_RE = re.compile(r'\b(\d{5})-?(\d{3})\b')
+CITY_UF_RE = re.compile(r'^(.+?)\s*-\s*([A-Z]{2})$')
+COUNTRY_RE = re.compile(r'^(brasil|brazil)$', re.IGNORECASE)
+
+def location_key(text):
+    """Chave de busca: sem acento, minúsculas, só letras/dígitos e espaços"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+def street_key(text):
+    key = location_key(text)
+    first, _, rest = key.partition(' ')
+    if first in STREET_ABBREVIATIONS:
+        key = f"{STREET_ABBREVIATIONS[first]} {rest}".strip()
+    return key
+
+def normalize_cep(text):
+    """CEP só com dígitos; aceita prefixos ("80", "80420") para filtros"""
+    return ''.join(filter(str.isdigit, str(text or '')))[:8]
+
+def _is_street(text):
+    first = location_key(text).partition(' ')[0]
+    return first in STREET_ABBREVIATIONS or first in STREET_TYPES
+
+def parse_address(address):
+    """Separa CEP, bairro e logradouro; campos não encontrados ficam vazios
+
+    Sempre retorna todas as chaves de ADDRESS_FIELDS (cep '' marca o endereço
+    como processado, mesmo sem CEP), ou tudo None se não houver endereço.
+    """
+    if not address:
+        return dict.fromkeys(ADDRESS_FIELDS)
+
+    text = ' '.join(address.split())
+    cep = ''
+    matches = list(CEP_RE.finditer(text))
+    if matches:
+        cep = ''.join(matches[-1].groups())
+        text = text[:matches[-1].start()] + text[matches[-1].end():]
+
+    parts = [part.strip(' -') for part in text.split(',')]
+    parts = [part for part in parts if part and not COUNTRY_RE.match(part)]
+
+    # Cidade - UF no fim
+    if parts:
+        city = CITY_UF_RE.match(parts[-1])
+        if city and city.group(2) in UFS:
+            parts.pop()
+
+    street = neighborhood = ''
+    if parts:
+        segments = [segment.strip() for segment in parts[0].split(' - ') if segment.strip()]
+        if segments and (_is_street(segments[0]) or len(parts) > 1 or len(segments) > 1):
+            street = segments[0]
+            # Bairro: último trecho depois do número que não é complemento
+            tail = segments[1:] + [segment.strip() for part in parts[1:] for segment in part.split(' - ')]
+            candidates = [segment for segment in tail if segment and not COMPLEMENT_RE.match(segment)]
+            neighborhood = candidates[-1] if candidates else ''
+        elif segments:
+            # Só um nome, sem cara de logradouro ("Batel, Curitiba - PR")
+            neighborhood = segments[0]
+
+    street, neighborhood = street[:255], neighborhood[:100]
+    return {
+        'cep': cep,
+        'neighborhood': neighborhood or None,
+        'neighborhood_key': location_key(neighborhood) or None,
+        'street': street or None,
+        'street_key': street_key(street)[:255] or None
+    }
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value if item and str(item).strip()]
+
+def filter_by_location(query, cep=None, neighborhood=None, street=None):
+    """Aplica filtros geográficos indexados; cada filtro aceita um valor, lista ou "a,b"
+
+    CEP é por prefixo ("80" = todos os 80xxx-xxx), feito como intervalo
+    (cep >= '80' AND cep < '80:') para usar o índice em qualquer banco.
+    """
+    ceps = [normalize_cep(value) for value in _as_list(cep)]
+    ceps = [value for value in ceps if value]
+    if ceps:
+        query = query.filter(or_(*[
+            Business.cep == value if len(value) == 8 else Business.cep.between(value, value + ':')
+            for value in ceps
+        ]))
+
+    neighborhoods = [location_key(value) for value in _as_list(neighborhood)]
+    if neighborhoods:
+        query = query.filter(Business.neighborhood_key.in_(neighborhoods))
+
+    streets = [street_key(value) for value in _as_list(street)]
+    if streets:
+        query = query.filter(Business.street_key.in_(streets))
+
+    return query
+
+def location_filter_from(mapping):
+    """Filtros cep/neighborhood/street de request.args ou de um dict JSON"""
+    return {key: mapping.get(key) for key in ('cep', 'neighborhood', 'street') if mapping.get(key)}
+
+def backfill_addresses(batch_size=BATCH_SIZE):
+    """Preenche CEP/bairro/logradouro dos negócios com endereço ainda não processado"""
+    db = SessionLocal()
+    table = Business.__table__
+    statement = update(table).where(table.c.id == bindparam('b_id')).values(
+        {field: bindparam(f'b_{field}') for field in ADDRESS_FIELDS}
+    )
+    updated = 0
+    try:
+        while True:
+            rows = db.query(Business.id, Business.address).filter(
+                Business.cep.is_(None),
+                Business.address.isnot(None),
+                Business.address != ''
+            ).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            db.execute(statement, [
+                {'b_id': row.id, **{f'b_{field}': value for field, value in parse_address(row.address).items()}}
+                for row in rows
+            ])
+            db.commit()
+            updated += len(rows)
+
+        if updated:
+            logger.info(f"Endereço separado em CEP/bairro/logradouro para {updated} negócios")
+        return updated
+
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    init_db()
+    print(f"Negócios processados: {backfill_addresses()}")
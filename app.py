@@ -4,37 +4,52 @@ import os
 import json
 import logging
 from datetime import datetime
+from sqlalchemy import func
 from config import get_config
-from models import Business, MessageLog, ScrapingSession, SessionLocal, init_db
-from scraper import run_scraping
-from sender import run_message_campaign
+from log_config import setup_logging
+from models import Business, ScrapingSession, SuppressedPhone, SessionLocal, init_db
+from suppression import suppress_phones, import_suppression_csv
+from dry_run import simulate_campaign
+from scheduler import get_dispatcher
+from retention import messages_sent_total, messages_sent_by_day, start_retention_scheduler
+from address_parser import filter_by_location, location_filter_from
+from http_cache import business_data_version, conditional, init_http_cache
 import threading
-import pandas as pd
+
+# scraper/sender (Selenium, webdriver_manager) e pandas são importados apenas
+# quando um job roda, para manter o boot do worker web leve (ver boot_check.py)
 
 # Configurar aplicação
 config_class = get_config()
 app = Flask(__name__)
 app.config.from_object(config_class)
+init_http_cache(app)
 
-# Configurar logging
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    level=getattr(logging, app.config['LOG_LEVEL']),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(app.config['LOG_FILE']),
-        logging.StreamHandler()
-    ]
-)
+# Configurar logging (fila + thread de escrita, ver log_config.py)
+setup_logging(level=app.config['LOG_LEVEL'], log_file=app.config['LOG_FILE'])
 logger = logging.getLogger(__name__)
 
-# Inicializar banco de dados
-init_db()
+# Inicializar banco de dados na primeira requisição (não no import)
+_db_ready = False
+_db_lock = threading.Lock()
+
+@app.before_request
+def ensure_db():
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            init_db()
+            start_retention_scheduler()
+            _db_ready = True
 
 # Status global das operações
 operation_status = {
     'scraping': {'running': False, 'progress': ''},
-    'messaging': {'running': False, 'progress': ''}
+    'messaging': {'running': False, 'progress': ''},
+    'enrichment': {'running': False, 'progress': ''},
+    'import': {'running': False, 'progress': ''}
 }
 
 @app.route('/')
@@ -45,7 +60,7 @@ def index():
         # Estatísticas gerais
         total_businesses = db.query(Business).count()
         total_with_phone = db.query(Business).filter(Business.phone.isnot(None), Business.phone != '').count()
-        messages_sent = db.query(MessageLog).filter(MessageLog.message_sent == True).count()
+        messages_sent = messages_sent_total(db)
         
         # Últimas sessões de scraping
         recent_sessions = db.query(ScrapingSession).order_by(ScrapingSession.started_at.desc()).limit(5).all()
@@ -83,7 +98,7 @@ def messaging_page():
         ).count()
         
         # Negócios que já receberam mensagem
-        sent_messages = db.query(MessageLog).filter(MessageLog.message_sent == True).count()
+        sent_messages = messages_sent_total(db)
         
         return render_template('messaging.html', 
                              categories=categories,
@@ -99,17 +114,17 @@ def reports_page():
     db = SessionLocal()
     try:
         # Dados para relatórios
-        businesses_by_category = db.query(Business.category, db.func.count(Business.id)).group_by(Business.category).all()
+        businesses_by_category = [
+            tuple(row) for row in db.query(Business.category, func.count(Business.id)).group_by(Business.category)
+        ]
         
-        # Mensagens por dia
-        messages_by_date = db.query(
-            db.func.date(MessageLog.sent_at),
-            db.func.count(MessageLog.id)
-        ).filter(MessageLog.message_sent == True).group_by(db.func.date(MessageLog.sent_at)).all()
+        # Mensagens por dia (inclui totais já arquivados)
+        messages_by_date = messages_sent_by_day(db)
         
         return render_template('reports.html',
                              businesses_by_category=businesses_by_category,
-                             messages_by_date=messages_by_date)
+                             messages_by_date=messages_by_date,
+                             status=operation_status)
     finally:
         db.close()
 
@@ -127,11 +142,14 @@ def start_scraping():
         return jsonify({'success': False, 'error': 'Nenhuma palavra-chave fornecida'})
     
     def run_scraping_thread():
+        from scraper import run_scraping
+        
         operation_status['scraping']['running'] = True
         operation_status['scraping']['progress'] = 'Iniciando scraping...'
         
         try:
-            result = run_scraping(keywords, max_results)
+            result = run_scraping(keywords, max_results, city=data.get('city'), capture=data.get('capture'),
+                                  extraction_mode=data.get('extraction_mode'))
             operation_status['scraping']['progress'] = f"Concluído: {result.get('total_businesses', 0)} negócios encontrados"
         except Exception as e:
             operation_status['scraping']['progress'] = f"Erro: {str(e)}"
@@ -145,54 +163,216 @@ def start_scraping():
 
 @app.route('/api/start_messaging', methods=['POST'])
 def start_messaging():
-    """Inicia campanha de mensagens"""
-    if operation_status['messaging']['running']:
-        return jsonify({'success': False, 'error': 'Campanha já está em execução'})
-    
+    """Enfileira campanha de mensagens no despachante (várias campanhas podem coexistir)"""
     data = request.json
     max_messages = int(data.get('max_messages', 50))
     messages_per_hour = int(data.get('messages_per_hour', 10))
     category_filter = data.get('category_filter')
+    location_filter = location_filter_from(data.get('location_filter') or {})
     test_mode = data.get('test_mode', False)
     
-    def run_messaging_thread():
+    quiet_hours = None
+    if data.get('quiet_hours_start') is not None and data.get('quiet_hours_end') is not None:
+        quiet_hours = (int(data['quiet_hours_start']), int(data['quiet_hours_end']))
+    
+    def on_campaign_complete(result):
+        operation_status['messaging']['running'] = bool(get_dispatcher().active_campaigns())
+        if result.get('success'):
+            operation_status['messaging']['progress'] = f"Concluído: {result['successful_sends']} mensagens enviadas"
+        else:
+            operation_status['messaging']['progress'] = f"Erro: {result.get('error', 'Erro desconhecido')}"
+    
+    from sender import run_message_campaign
+    
+    try:
+        result = run_message_campaign(
+            max_messages=max_messages,
+            messages_per_hour=messages_per_hour,
+            category_filter=category_filter,
+            location_filter=location_filter,
+            test_mode=test_mode,
+            quiet_hours=quiet_hours,
+            wait=False,
+            on_complete=on_campaign_complete
+        )
+    except Exception as e:
+        operation_status['messaging']['progress'] = f"Erro: {str(e)}"
+        return jsonify({'success': False, 'error': str(e)})
+    
+    if not result['success']:
+        return jsonify({'success': False, 'error': result.get('error', 'Erro desconhecido')})
+    
+    if result.get('queued'):
         operation_status['messaging']['running'] = True
-        operation_status['messaging']['progress'] = 'Iniciando campanha...'
+        operation_status['messaging']['progress'] = f"Campanha {result['campaign_id']} na fila: {result['total_targets']} negócios"
+    
+    return jsonify({'success': True, 'message': 'Campanha iniciada', **result})
+
+@app.route('/api/campaigns')
+def list_campaigns():
+    """Campanhas ativas no despachante"""
+    return jsonify({'campaigns': get_dispatcher().active_campaigns()})
+
+@app.route('/api/dry_run', methods=['POST'])
+def dry_run():
+    """Simula campanha sem navegador e retorna a projeção de envio"""
+    data = request.json or {}
+    max_messages = data.get('max_messages')
+    
+    result = simulate_campaign(
+        max_messages=int(max_messages) if max_messages else None,
+        messages_per_hour=int(data.get('messages_per_hour', app.config['MAX_MESSAGES_PER_HOUR'])),
+        category_filter=data.get('category_filter'),
+        location_filter=location_filter_from(data.get('location_filter') or {}),
+        output=data.get('output', 'csv')
+    )
+    return jsonify(result)
+
+@app.route('/api/status')
+@conditional(lambda: operation_status)
+def get_status():
+    """Retorna status das operações"""
+    return jsonify(operation_status)
+
+@app.route('/api/start_enrichment', methods=['POST'])
+def start_enrichment():
+    """Inicia visita aos websites para coletar e-mail e redes sociais"""
+    if operation_status['enrichment']['running']:
+        return jsonify({'success': False, 'error': 'Enriquecimento já está em execução'})
+    
+    data = request.json or {}
+    limit = int(data['limit']) if data.get('limit') else None
+    
+    def report_progress(done, total):
+        operation_status['enrichment']['progress'] = f"{done}/{total} sites visitados"
+    
+    def run_enrichment_thread():
+        from enrichment import run_enrichment
+        
+        operation_status['enrichment']['running'] = True
+        operation_status['enrichment']['progress'] = 'Iniciando enriquecimento...'
         
         try:
-            result = run_message_campaign(
-                max_messages=max_messages,
-                messages_per_hour=messages_per_hour,
-                category_filter=category_filter,
-                test_mode=test_mode
-            )
-            
+            result = run_enrichment(limit=limit, progress=report_progress)
             if result['success']:
-                operation_status['messaging']['progress'] = f"Concluído: {result['successful_sends']} mensagens enviadas"
+                operation_status['enrichment']['progress'] = f"Concluído: {result['processed']} sites, {result['emails']} e-mails"
             else:
-                operation_status['messaging']['progress'] = f"Erro: {result.get('error', 'Erro desconhecido')}"
-                
+                operation_status['enrichment']['progress'] = f"Erro: {result.get('error', 'Erro desconhecido')}"
         except Exception as e:
-            operation_status['messaging']['progress'] = f"Erro: {str(e)}"
+            operation_status['enrichment']['progress'] = f"Erro: {str(e)}"
         finally:
-            operation_status['messaging']['running'] = False
+            operation_status['enrichment']['running'] = False
     
-    thread = threading.Thread(target=run_messaging_thread)
+    thread = threading.Thread(target=run_enrichment_thread)
     thread.start()
     
-    return jsonify({'success': True, 'message': 'Campanha iniciada'})
+    return jsonify({'success': True, 'message': 'Enriquecimento iniciado'})
 
-@app.route('/api/status')
-def get_status():
-    """Retorna status das operações"""
-    return jsonify(operation_status)
+@app.route('/api/import', methods=['POST'])
+def import_file():
+    """Importa lista de leads (CSV, JSONL ou XLSX) em segundo plano"""
+    if operation_status['import']['running']:
+        return jsonify({'success': False, 'error': 'Importação já está em execução'})
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'})
+    
+    on_duplicate = request.form.get('on_duplicate', 'skip')
+    encoding = request.form.get('encoding', 'utf-8-sig')
+    
+    # O upload é salvo em disco para ser lido em streaming fora da requisição
+    os.makedirs('data/imports', exist_ok=True)
+    filename = os.path.basename(upload.filename)
+    path = os.path.join('data/imports', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
+    upload.save(path)
+    
+    def report_progress(stats):
+        operation_status['import']['progress'] = f"{stats['rows']} linhas lidas, {stats['inserted']} inseridas"
+    
+    def run_import_thread():
+        from importer import import_leads
+        
+        operation_status['import']['running'] = True
+        operation_status['import']['progress'] = f"Importando {filename}..."
+        
+        try:
+            with open(path, 'rb') as f:
+                result = import_leads(f, filename=filename, on_duplicate=on_duplicate,
+                                      encoding=encoding, progress=report_progress)
+            if result['success']:
+                operation_status['import']['progress'] = (
+                    f"Concluído: {result['inserted']} inseridos, {result['updated']} atualizados, "
+                    f"{result['duplicates']} duplicados, {result['errors']} com erro"
+                )
+                operation_status['import']['result'] = result
+            else:
+                operation_status['import']['progress'] = f"Erro: {result.get('error', 'Erro desconhecido')}"
+        except Exception as e:
+            operation_status['import']['progress'] = f"Erro: {str(e)}"
+        finally:
+            operation_status['import']['running'] = False
+            os.remove(path)
+    
+    thread = threading.Thread(target=run_import_thread)
+    thread.start()
+    
+    return jsonify({'success': True, 'message': f"Importação de {filename} iniciada"})
+
+@app.route('/api/backfill_addresses', methods=['POST'])
+def backfill_addresses_endpoint():
+    """Separa CEP/bairro/logradouro dos negócios ainda não processados"""
+    from address_parser import backfill_addresses
+    
+    return jsonify({'success': True, 'processed': backfill_addresses()})
+
+@app.route('/api/rescore', methods=['POST'])
+def rescore():
+    """Recalcula a pontuação de todos os leads"""
+    from lead_scoring import rescore_leads
+    
+    return jsonify(rescore_leads())
+
+@app.route('/api/retention', methods=['POST'])
+def retention():
+    """Executa o arquivamento de histórico antigo imediatamente"""
+    from retention import run_retention
+    
+    return jsonify(run_retention())
+
+@app.route('/api/suppress', methods=['GET', 'POST'])
+def suppress():
+    """Adiciona telefones à lista de supressão (JSON ou upload de CSV)"""
+    if request.method == 'GET':
+        db = SessionLocal()
+        try:
+            return jsonify({'total': db.query(SuppressedPhone).count()})
+        finally:
+            db.close()
+    
+    try:
+        upload = request.files.get('file')
+        if upload:
+            result = import_suppression_csv(upload.stream, reason=request.form.get('reason'))
+        else:
+            data = request.json or {}
+            phones = data.get('phones') or ([data['phone']] if data.get('phone') else [])
+            if not phones:
+                return jsonify({'success': False, 'error': 'Nenhum telefone fornecido'})
+            result = suppress_phones(phones, reason=data.get('reason'))
+        
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        logger.error(f"Erro ao atualizar lista de supressão: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/api/export_excel')
 def export_excel():
     """Exporta dados para Excel"""
     try:
         db = SessionLocal()
-        businesses = db.query(Business).all()
+        businesses = filter_by_location(db.query(Business), **location_filter_from(request.args)).all()
         
         data = []
         for business in businesses:
@@ -200,14 +380,22 @@ def export_excel():
                 'Nome': business.name,
                 'Telefone': business.phone,
                 'Endereço': business.address,
+                'Bairro': business.neighborhood,
+                'CEP': business.cep,
                 'Categoria': business.category,
                 'Avaliação': business.rating,
                 'Número de Avaliações': business.reviews_count,
                 'Website': business.website,
+                'Site Ativo': business.website_alive,
+                'E-mail': business.email,
+                'Instagram': business.instagram,
+                'Facebook': business.facebook,
                 'Palavra-chave': business.scraped_keyword,
                 'Data Captura': business.created_at.strftime('%d/%m/%Y %H:%M')
             })
         
+        import pandas as pd
+        
         df = pd.DataFrame(data)
         filename = f"export/negocios_curitiba_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         os.makedirs('export', exist_ok=True)
@@ -221,6 +409,7 @@ def export_excel():
         db.close()
 
 @app.route('/api/businesses')
+@conditional(business_data_version, cache_control='private, no-cache')
 def get_businesses():
     """API para listar negócios"""
     db = SessionLocal()
@@ -234,6 +423,9 @@ def get_businesses():
         if category:
             query = query.filter(Business.category.contains(category))
         
+        # Filtros geográficos: ?neighborhood=Batel&cep=80420&street=Rua XV de Novembro
+        query = filter_by_location(query, **location_filter_from(request.args))
+        
         total = query.count()
         businesses = query.offset((page - 1) * per_page).limit(per_page).all()
         
@@ -244,9 +436,18 @@ def get_businesses():
                 'name': business.name,
                 'phone': business.phone,
                 'address': business.address,
+                'street': business.street,
+                'neighborhood': business.neighborhood,
+                'cep': business.cep,
                 'category': business.category,
                 'rating': business.rating,
                 'reviews_count': business.reviews_count,
+                'lead_score': business.lead_score,
+                'website': business.website,
+                'website_alive': business.website_alive,
+                'email': business.email,
+                'instagram': business.instagram,
+                'facebook': business.facebook,
                 'created_at': business.created_at.strftime('%d/%m/%Y %H:%M')
             })
         
@@ -0,0 +1,36 @@
+
+"""
+Compara os perfis de navegador do scraper (full x lean).
+
+Executa a mesma busca com cada perfil e mostra tempo médio de carregamento
+de página e memória dos processos do Chrome.
+
+Uso: python benchmark_browser.py "padaria" 10
+"""
+import sys
+from scraper import GoogleMapsScraper
+from log_config import setup_logging
+
+def run_benchmark(keyword, max_results=10, profiles=('full', 'lean')):
+    results = []
+    for profile in profiles:
+        scraper = GoogleMapsScraper(headless=True, browser_profile=profile)
+        try:
+            businesses = scraper.search_businesses(keyword, max_results)
+            metrics = scraper.get_metrics()
+            metrics['businesses'] = len(businesses)
+            results.append(metrics)
+        finally:
+            scraper.close()
+    return results
+
+if __name__ == "__main__":
+    setup_logging(level='WARNING')
+    keyword = sys.argv[1] if len(sys.argv) > 1 else 'padaria'
+    max_results = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print(f"{'Perfil':<8} {'Negócios':>9} {'Páginas':>8} {'Média (ms)':>11} {'RSS total (MB)':>15} {'RSS/navegador (MB)':>19}")
+    for metrics in run_benchmark(keyword, max_results):
+        print(f"{metrics['profile']:<8} {metrics['businesses']:>9} {metrics['page_loads']:>8} "
+              f"{metrics['avg_page_load_ms'] or 0:>11} {metrics['peak_rss_mb'] or 0:>15} "
+              f"{metrics['peak_rss_per_browser_mb'] or 0:>19}")
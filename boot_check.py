@@ -0,0 +1,61 @@
+
+"""
+Mede o custo de boot do processo web (import de app.py) e compara com o
+orçamento definido em Config (BOOT_IMPORT_BUDGET_MS / BOOT_RSS_BUDGET_MB).
+
+Também falha se módulos pesados, que só os jobs usam, forem carregados no
+import: o worker do gunicorn não deve pagar por Selenium ou pandas.
+
+Uso: python boot_check.py
+"""
+import json
+import subprocess
+import sys
+from config import get_config
+
+# Módulos que não devem ser carregados pelo processo web no boot
+HEAVY_MODULES = ['selenium', 'webdriver_manager', 'pandas', 'numpy', 'openpyxl']
+
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed_ms = (time.perf_counter() - start) * 1000
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_ms': round(elapsed_ms, 1),
+    'rss_mb': round(rss_kb / 1024, 1),
+    'heavy_modules': sorted(m for m in %r if m in sys.modules)
+}))
+"""
+
+def measure():
+    """Importa app.py em um processo novo e retorna tempo, RSS e módulos pesados"""
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE_SCRIPT % (HEAVY_MODULES,)],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    config = get_config()
+    result = measure()
+
+    problems = []
+    if result['import_ms'] > config.BOOT_IMPORT_BUDGET_MS:
+        problems.append(f"import levou {result['import_ms']} ms (orçamento {config.BOOT_IMPORT_BUDGET_MS} ms)")
+    if result['rss_mb'] > config.BOOT_RSS_BUDGET_MB:
+        problems.append(f"RSS de {result['rss_mb']} MB (orçamento {config.BOOT_RSS_BUDGET_MB} MB)")
+    if result['heavy_modules']:
+        problems.append(f"módulos pesados carregados no boot: {', '.join(result['heavy_modules'])}")
+
+    print(json.dumps(result))
+    for problem in problems:
+        print(f"FALHA: {problem}")
+
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
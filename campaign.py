@@ -0,0 +1,97 @@
+
+"""
+Seleção de alvos e personalização de mensagens das campanhas.
+
+Módulo sem dependência de Selenium: usado tanto pelo envio real
+(sender.py) quanto pela simulação (dry_run.py).
+"""
+from datetime import timedelta
+from sqlalchemy import or_, select
+from models import Business, MessageLog, SuppressedPhone
+from address_parser import backfill_addresses, filter_by_location
+from suppression import backfill_normalized_phones
+
+MESSAGE_TEMPLATE = """Olá {nome},
+
+Seu negócio em Curitiba merece mais do que apenas ser encontrado. Ele merece ser descoberto por clientes prontos para comprar, que buscam ativamente o que você oferece, bem aqui na sua região.
+
+Você já usa o Google Meu Negócio? Ótimo! Ele ajuda a ser visto. Mas e se eu te disser que existe uma forma de ir além, de alcançar um público que já está buscando soluções locais e específicas, com um suporte personalizado que o Google não oferece?
+
+No Propagou Negócios, nós não apenas listamos sua empresa; nós a promovemos ativamente para um público engajado em Curitiba e região. Nos últimos 90 dias, tivemos mais de 3.900 visitantes únicos e 4.100 pageviews, com um crescimento de mais de 23%!
+
+Isso significa que seu anúncio estará em um ambiente onde as pessoas já estão com a intenção de compra, buscando guias de empregos, informações sobre bairros e listas de serviços – ou seja, clientes qualificados esperando para te encontrar.
+
+Quer saber como podemos levar seu negócio para o próximo nível e transformar essa visibilidade em vendas reais? É rápido e sem compromisso.
+
+Responda a esta mensagem ou clique no link para conversarmos:
+https://wa.me/5541995343245
+
+Atenciosamente,
+Equipe Propagou Negócios"""
+
+def prepare_targets(location_filter=None):
+    """Backfills que a seleção de alvos pressupõe; roda antes da campanha real e da simulação
+
+    Sem phone_normalized o anti-join da lista de supressão não casa o negócio;
+    sem CEP/bairro/logradouro os filtros geográficos não acham negócios antigos.
+    """
+    backfill_normalized_phones()
+    if location_filter:
+        backfill_addresses()
+
+def personalize_message(template, name):
+    """Personaliza a mensagem com o primeiro nome do negócio"""
+    return template.format(
+        nome=name.split()[0] if name else "Empresário"
+    )
+
+def messaging_targets_query(db, *entities, category_filter=None, location_filter=None):
+    """Consulta de negócios elegíveis para mensagem, ordenada por lead_score (sem limite)
+
+    location_filter: dict com cep (prefixo), neighborhood e/ou street (address_parser.py)
+    """
+    query = db.query(*(entities or (Business,))).filter(Business.phone.isnot(None), Business.phone != '')
+
+    if category_filter:
+        query = query.filter(Business.category.contains(category_filter))
+
+    if location_filter:
+        query = filter_by_location(query, **location_filter)
+
+    # Excluir negócios que já receberam mensagem (last_contacted_at cobre o histórico arquivado)
+    # ou que têm envio ainda pendente no serviço do WhatsApp
+    query = query.filter(Business.last_contacted_at.is_(None))
+    sent_business_ids = select(MessageLog.business_id).where(
+        or_(MessageLog.message_sent == True, MessageLog.pending_job_id.isnot(None))
+    )
+    query = query.filter(~Business.id.in_(sent_business_ids))
+
+    # Excluir telefones na lista de supressão (anti-join pelo índice de telefone)
+    query = query.filter(
+        ~db.query(SuppressedPhone.id).filter(SuppressedPhone.phone == Business.phone_normalized).exists()
+    )
+
+    # Melhores leads primeiro. A ordem é a do índice ix_businesses_lead_score_rank
+    # (lead_score DESC, id): com estatísticas atualizadas (ANALYZE em rescore_leads)
+    # o LIMIT n percorre o índice aplicando os filtros, sem ordenar os elegíveis
+    return query.order_by(Business.lead_score.desc(), Business.id)
+
+def next_allowed_time(moment, quiet_start=None, quiet_end=None):
+    """Adia o horário para o fim do período de silêncio, se cair dentro dele"""
+    if quiet_start is None or quiet_end is None or quiet_start == quiet_end:
+        return moment
+
+    end_today = moment.replace(hour=quiet_end, minute=0, second=0, microsecond=0)
+
+    if quiet_start < quiet_end:
+        # Janela no mesmo dia (ex: 0h às 7h)
+        if quiet_start <= moment.hour < quiet_end:
+            return end_today
+        return moment
+
+    # Janela que atravessa a meia-noite (ex: 20h às 8h)
+    if moment.hour >= quiet_start:
+        return end_today + timedelta(days=1)
+    if moment.hour < quiet_end:
+        return end_today
+    return moment
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
@@ -20,17 +21,92 @@ class Config:
     # Configurações do Selenium
     SELENIUM_HEADLESS = os.getenv('SELENIUM_HEADLESS', 'True').lower() == 'true'
     CHROME_DRIVER_PATH = os.getenv('CHROME_DRIVER_PATH', None)
+    # 'lean' bloqueia imagens, fontes, mídia e tiles do mapa; 'full' carrega a página completa
+    SCRAPER_BROWSER_PROFILE = os.getenv('SCRAPER_BROWSER_PROFILE', 'full')
+    
+    # Planejamento geográfico das buscas (search_planner.py)
+    SEARCH_CITY = os.getenv('SEARCH_CITY', 'Curitiba')
+    CITY_DEFINITIONS_FILE = os.getenv('CITY_DEFINITIONS_FILE', '')
+    SEARCH_TILING = os.getenv('SEARCH_TILING', 'auto')  # auto, off, grid, neighborhoods
+    SEARCH_GRID_SIZE = int(os.getenv('SEARCH_GRID_SIZE', 3))
+    SEARCH_MAX_TILE_DEPTH = int(os.getenv('SEARCH_MAX_TILE_DEPTH', 2))
+    SEARCH_TILE_RESULT_CAP = int(os.getenv('SEARCH_TILE_RESULT_CAP', 120))
+    SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 1))
+    SCRAPER_EXTRACT_WORKERS = int(os.getenv('SCRAPER_EXTRACT_WORKERS', 1))
+    # Prazos por operação (segundos), retentativas e watchdog de navegador travado
+    SCRAPER_PAGE_LOAD_TIMEOUT = int(os.getenv('SCRAPER_PAGE_LOAD_TIMEOUT', 30))
+    SCRAPER_SCRIPT_TIMEOUT = int(os.getenv('SCRAPER_SCRIPT_TIMEOUT', 15))
+    SCRAPER_RESULT_TIMEOUT = int(os.getenv('SCRAPER_RESULT_TIMEOUT', 60))
+    SCRAPER_MAX_RETRIES = int(os.getenv('SCRAPER_MAX_RETRIES', 2))
+    SCRAPER_RETRY_BACKOFF = float(os.getenv('SCRAPER_RETRY_BACKOFF', 2.0))
+    # 'network' lê os lugares das respostas JSON da busca (logs de performance do
+    # Chrome) sem abrir cada um; 'dom' abre cada lugar. Sem payload, cai no DOM
+    SCRAPER_EXTRACTION_MODE = os.getenv('SCRAPER_EXTRACTION_MODE', 'dom')
+    # Guardar o HTML do painel de detalhes para re-extração offline (snapshots.py)
+    SCRAPER_CAPTURE = os.getenv('SCRAPER_CAPTURE', 'False').lower() == 'true'
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'data/snapshots')
     
     # Configurações de WhatsApp (se usar)
     WHATSAPP_SESSION_PATH = os.getenv('WHATSAPP_SESSION_PATH', 'whatsapp_session')
     
+    # Serviço de sessão persistente do WhatsApp (whatsapp_service.py)
+    WHATSAPP_SERVICE_URL = os.getenv('WHATSAPP_SERVICE_URL', '')  # ex: http://127.0.0.1:5055
+    WHATSAPP_SERVICE_HOST = os.getenv('WHATSAPP_SERVICE_HOST', '127.0.0.1')
+    WHATSAPP_SERVICE_PORT = int(os.getenv('WHATSAPP_SERVICE_PORT', 5055))
+    WHATSAPP_HEALTH_INTERVAL = int(os.getenv('WHATSAPP_HEALTH_INTERVAL', 60))
+    # Prazo (segundos) para o cliente acompanhar um envio na fila do serviço
+    WHATSAPP_SEND_TIMEOUT = int(os.getenv('WHATSAPP_SEND_TIMEOUT', 900))
+    
     # Configurações de rate limiting
     MAX_MESSAGES_PER_HOUR = int(os.getenv('MAX_MESSAGES_PER_HOUR', 10))
     MAX_SCRAPING_RESULTS = int(os.getenv('MAX_SCRAPING_RESULTS', 100))
     
+    # Horário de silêncio das campanhas (horas 0-23; vazio desativa)
+    QUIET_HOURS_START = int(os.getenv('QUIET_HOURS_START')) if os.getenv('QUIET_HOURS_START') else None
+    QUIET_HOURS_END = int(os.getenv('QUIET_HOURS_END')) if os.getenv('QUIET_HOURS_END') else None
+    
+    # Enriquecimento pelo website (enrichment.py)
+    ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', 8))
+    ENRICH_TIMEOUT = int(os.getenv('ENRICH_TIMEOUT', 10))
+    ENRICH_MAX_BYTES = int(os.getenv('ENRICH_MAX_BYTES', 512000))
+    ENRICH_MAX_AGE_DAYS = int(os.getenv('ENRICH_MAX_AGE_DAYS', 30))
+    
+    # Importação de listas de leads (importer.py): linhas por lote/commit
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+    
+    # Pontuação de leads (lead_scoring.py); pesos em JSON, ex: {"rating": 0.4, "website": 0.2}
+    LEAD_SCORE_WEIGHTS = json.loads(os.getenv('LEAD_SCORE_WEIGHTS', '{}'))
+    LEAD_CATEGORY_WEIGHTS = json.loads(os.getenv('LEAD_CATEGORY_WEIGHTS', '{}'))  # ex: {"restaurante": 1.0}
+    LEAD_RECENCY_HALF_LIFE_DAYS = int(os.getenv('LEAD_RECENCY_HALF_LIFE_DAYS', 90))
+    
+    # Retenção de histórico (retention.py); 0 desativa o arquivamento da tabela
+    RETENTION_MESSAGE_LOG_DAYS = int(os.getenv('RETENTION_MESSAGE_LOG_DAYS', 180))
+    RETENTION_SESSION_DAYS = int(os.getenv('RETENTION_SESSION_DAYS', 90))
+    RETENTION_TARGET = os.getenv('RETENTION_TARGET', 'table')  # table (tabelas *_archive) ou file (JSONL gzip)
+    RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', 'data/archive')
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 5000))
+    RETENTION_SCHEDULE_HOUR = int(os.getenv('RETENTION_SCHEDULE_HOUR', 3))
+    RETENTION_SCHEDULER_ENABLED = os.getenv('RETENTION_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    
+    # Respostas HTTP (http_cache.py): compressão brotli (pacote opcional) ou gzip
+    HTTP_COMPRESSION = os.getenv('HTTP_COMPRESSION', 'True').lower() == 'true'
+    HTTP_COMPRESSION_MIN_BYTES = int(os.getenv('HTTP_COMPRESSION_MIN_BYTES', 1024))
+    HTTP_GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', 6))
+    HTTP_BROTLI_QUALITY = int(os.getenv('HTTP_BROTLI_QUALITY', 5))
+    
+    # Orçamento de boot do processo web (verificado por boot_check.py)
+    BOOT_IMPORT_BUDGET_MS = int(os.getenv('BOOT_IMPORT_BUDGET_MS', 1500))
+    BOOT_RSS_BUDGET_MB = int(os.getenv('BOOT_RSS_BUDGET_MB', 120))
+    
     # Configurações de logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # formato do console: text ou json (o arquivo é sempre JSON)
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    # Amostragem de INFO/DEBUG repetitivos por módulo, ex: {"scraper": 10} mantém 1 de cada 10
+    LOG_SAMPLING = json.loads(os.getenv('LOG_SAMPLING', '{"scraper": 10}'))
+    LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 20))
 
 class DevelopmentConfig(Config):
     """Configuração para desenvolvimento"""
@@ -43,11 +119,10 @@ class ProductionConfig(Config):
     SECRET_KEY = os.getenv('SECRET_KEY')  # Obrigatório em produção
     
     # Usar PostgreSQL em produção se disponível
-    if os.getenv('DATABASE_URL'):
-        DATABASE_URL = os.getenv('DATABASE_URL')
+    DATABASE_URL = os.getenv('DATABASE_URL', Config.DATABASE_URL)
     
     # Configurações específicas para Railway
-    if IS_RAILWAY:
+    if Config.IS_RAILWAY:
         HOST = '0.0.0.0'
         PORT = int(os.getenv('PORT', 5000))
         # Converter postgres:// para postgresql:// se necessário
@@ -0,0 +1,168 @@
+
+"""
+Simulação de campanhas sem navegador.
+
+Executa a mesma seleção de alvos e a mesma lista de supressão da
+campanha real, personaliza cada mensagem e projeta o horário de envio
+no ritmo configurado. O resultado vai para um CSV em export/ ou para a
+tabela campaign_previews.
+"""
+import csv
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from models import Business, CampaignPreview, SessionLocal, init_db
+from config import get_config
+from log_config import setup_logging
+from campaign import MESSAGE_TEMPLATE, personalize_message, messaging_targets_query, next_allowed_time, prepare_targets
+from suppression import normalize_phone, load_suppressed_phones
+
+logger = logging.getLogger(__name__)
+
+# Linhas lidas do banco / gravadas por lote
+CHUNK_SIZE = 5000
+
+def iter_preview_rows(db, max_messages, messages_per_hour, category_filter=None, location_filter=None,
+                      start_at=None, quiet_hours=(None, None), template=MESSAGE_TEMPLATE, stats=None):
+    """Gera as linhas da simulação, uma por mensagem projetada"""
+    interval = timedelta(seconds=3600 / messages_per_hour)
+    quiet_start, quiet_end = quiet_hours
+    next_slot = start_at or datetime.now()
+    suppressed_phones = load_suppressed_phones(db)
+
+    query = messaging_targets_query(
+        db, Business.id, Business.name, Business.phone,
+        category_filter=category_filter,
+        location_filter=location_filter
+    )
+
+    if max_messages:
+        query = query.limit(max_messages)
+
+    position = 0
+    for business_id, name, phone in query.yield_per(CHUNK_SIZE):
+        # Checagem final em memória (cobre telefones ainda não normalizados)
+        if normalize_phone(phone) in suppressed_phones:
+            if stats is not None:
+                stats['suppressed'] += 1
+            continue
+
+        position += 1
+        scheduled_at = next_allowed_time(next_slot, quiet_start, quiet_end)
+        yield {
+            'position': position,
+            'business_id': business_id,
+            'business_name': name,
+            'phone': phone,
+            'message': personalize_message(template, name),
+            'scheduled_at': scheduled_at
+        }
+        next_slot = scheduled_at + interval
+
+def _write_csv(rows, filename):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    count = 0
+    last_row = None
+
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Posição', 'ID', 'Nome', 'Telefone', 'Envio Previsto', 'Mensagem'])
+        for row in rows:
+            writer.writerow([
+                row['position'],
+                row['business_id'],
+                row['business_name'],
+                row['phone'],
+                row['scheduled_at'].strftime('%d/%m/%Y %H:%M'),
+                row['message']
+            ])
+            count += 1
+            last_row = row
+
+    return count, last_row
+
+def _write_table(db, rows, run_id):
+    count = 0
+    last_row = None
+    chunk = []
+
+    for row in rows:
+        chunk.append({**row, 'run_id': run_id})
+        count += 1
+        last_row = row
+        if len(chunk) >= CHUNK_SIZE:
+            db.execute(insert(CampaignPreview), chunk)
+            chunk = []
+
+    if chunk:
+        db.execute(insert(CampaignPreview), chunk)
+
+    # Commit único: o cursor de leitura ainda está aberto na mesma conexão
+    db.commit()
+
+    return count, last_row
+
+def simulate_campaign(max_messages=50, messages_per_hour=10, category_filter=None, location_filter=None,
+                      output='csv', start_at=None, filename=None, quiet_hours=None):
+    """Simula uma campanha completa sem Selenium e retorna a projeção"""
+    init_db()
+    # Mesmos backfills da campanha real, para a simulação selecionar os mesmos alvos
+    prepare_targets(location_filter)
+    if quiet_hours is None:
+        config = get_config()
+        quiet_hours = (config.QUIET_HOURS_START, config.QUIET_HOURS_END)
+
+    db = SessionLocal()
+    started_at = start_at or datetime.now()
+    stats = {'suppressed': 0}
+
+    try:
+        rows = iter_preview_rows(
+            db, max_messages, messages_per_hour,
+            category_filter=category_filter,
+            location_filter=location_filter,
+            start_at=started_at,
+            quiet_hours=quiet_hours,
+            stats=stats
+        )
+
+        result = {
+            'success': True,
+            'dry_run': True,
+            'messages_per_hour': messages_per_hour,
+            'started_at': started_at.isoformat()
+        }
+
+        if output == 'table':
+            run_id = uuid.uuid4().hex
+            total, last_row = _write_table(db, rows, run_id)
+            result['run_id'] = run_id
+        else:
+            filename = filename or f"export/simulacao_campanha_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            total, last_row = _write_csv(rows, filename)
+            result['file'] = filename
+
+        projected_completion = last_row['scheduled_at'] if last_row else started_at
+        result.update({
+            'total_targets': total,
+            'successful_sends': total,
+            'suppressed': stats['suppressed'],
+            'projected_completion': projected_completion.isoformat(),
+            'duration_hours': round((projected_completion - started_at).total_seconds() / 3600, 2)
+        })
+
+        logger.info(f"Simulação: {total} mensagens, término previsto em {projected_completion:%d/%m/%Y %H:%M}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Erro na simulação: {str(e)}")
+        return {'success': False, 'dry_run': True, 'error': str(e)}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    result = simulate_campaign(max_messages=None, messages_per_hour=10)
+    print(f"Resultado da simulação: {result}")
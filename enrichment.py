@@ -0,0 +1,193 @@
+
+"""
+Enriquecimento de negócios a partir do website.
+
+Visita o site de cada negócio com um pool de conexões HTTP e concorrência
+limitada, e extrai e-mail, Instagram, Facebook e se o site está no ar.
+É incremental: negócios enriquecidos há menos de ENRICH_MAX_AGE_DAYS são
+pulados.
+"""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import or_
+from models import Business, SessionLocal, init_db
+from config import get_config
+from log_config import setup_logging, job_context, propagate_context
+from lead_scoring import rescore_leads
+
+logger = logging.getLogger(__name__)
+
+# Negócios processados / gravados por lote
+BATCH_SIZE = 200
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
+INSTAGRAM_RE = re.compile(r'https?://(?:www\.)?instagram\.com/([A-Za-z0-9_.]+)', re.IGNORECASE)
+FACEBOOK_RE = re.compile(r'https?://(?:www\.|m\.|pt-br\.)?facebook\.com/([A-Za-z0-9_.\-]+)', re.IGNORECASE)
+
+# Falsos positivos comuns (arquivos @2x, paths de compartilhamento etc.)
+IGNORED_EMAIL_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg')
+IGNORED_EMAIL_DOMAINS = ('example.com', 'sentry.io', 'wixpress.com', 'domain.com')
+IGNORED_INSTAGRAM_PATHS = {'p', 'explore', 'accounts', 'reel', 'stories', 'tv'}
+IGNORED_FACEBOOK_PATHS = {'sharer', 'sharer.php', 'plugins', 'tr', 'dialog', 'share.php', 'login'}
+
+def create_http_session(pool_size=8):
+    """Sessão com pool de conexões dimensionado para a concorrência"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=1, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+def normalize_url(url):
+    url = url.strip()
+    if not re.match(r'^https?://', url, re.IGNORECASE):
+        url = 'http://' + url
+    return url
+
+def fetch_page(session, url, timeout=10, max_bytes=512000):
+    """Baixa a página respeitando timeout e limite de tamanho do corpo"""
+    with session.get(normalize_url(url), timeout=(min(timeout, 5), timeout), stream=True) as response:
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=16384):
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                break
+        return response.status_code, decode_body(body, response.encoding)
+
+def decode_body(body, encoding):
+    """Decodifica o HTML; charset desconhecido pelo Python cai para utf-8"""
+    try:
+        return body.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def parse_contacts(html):
+    """Extrai primeiro e-mail, Instagram e Facebook encontrados no HTML"""
+    contacts = {'email': None, 'instagram': None, 'facebook': None}
+
+    for match in EMAIL_RE.finditer(html):
+        email = match.group(0).lower()
+        if email.endswith(IGNORED_EMAIL_SUFFIXES) or email.split('@')[1] in IGNORED_EMAIL_DOMAINS:
+            continue
+        contacts['email'] = email
+        break
+
+    for match in INSTAGRAM_RE.finditer(html):
+        if match.group(1).lower() not in IGNORED_INSTAGRAM_PATHS:
+            contacts['instagram'] = f"https://instagram.com/{match.group(1)}"
+            break
+
+    for match in FACEBOOK_RE.finditer(html):
+        if match.group(1).lower() not in IGNORED_FACEBOOK_PATHS:
+            contacts['facebook'] = f"https://facebook.com/{match.group(1)}"
+            break
+
+    return contacts
+
+def enrich_website(session, business_id, url, timeout=10, max_bytes=512000):
+    """Visita um site e devolve o mapeamento de colunas para atualizar o negócio
+
+    Só erro de conexão ou status HTTP de erro marcam o site como fora do ar.
+    Contatos entram no mapeamento apenas quando encontrados, para não apagar
+    os de um enriquecimento anterior.
+    """
+    result = {
+        'id': business_id,
+        'enriched_at': datetime.now()
+    }
+
+    try:
+        status, html = fetch_page(session, url, timeout=timeout, max_bytes=max_bytes)
+        result['website_status'] = status
+        result['website_alive'] = status < 400
+        if result['website_alive']:
+            result.update({field: value for field, value in parse_contacts(html).items() if value})
+    except requests.RequestException as e:
+        logger.debug(f"Site indisponível ({url}): {str(e)}")
+        result['website_alive'] = False
+        result['website_status'] = None
+    except Exception as e:
+        logger.error(f"Erro ao enriquecer {url}: {str(e)}")
+
+    return result
+
+@job_context('enrichment_job')
+def run_enrichment(limit=None, concurrency=None, max_age_days=None, session=None, progress=None):
+    """Enriquece negócios com website ainda não visitados (ou visitados há muito tempo)"""
+    init_db()
+    config = get_config()
+    concurrency = concurrency or config.ENRICH_CONCURRENCY
+    max_age_days = config.ENRICH_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    session = session or create_http_session(pool_size=concurrency)
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+
+    db = SessionLocal()
+    stats = {'processed': 0, 'alive': 0, 'emails': 0, 'instagram': 0, 'facebook': 0}
+
+    try:
+        query = db.query(Business.id, Business.website).filter(
+            Business.website.isnot(None),
+            Business.website != '',
+            or_(Business.enriched_at.is_(None), Business.enriched_at < cutoff)
+        ).order_by(Business.id)
+
+        if limit:
+            query = query.limit(limit)
+
+        targets = query.all()
+        logger.info(f"Enriquecimento: {len(targets)} sites para visitar")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for start in range(0, len(targets), BATCH_SIZE):
+                batch = targets[start:start + BATCH_SIZE]
+                mappings = list(executor.map(
+                    propagate_context(lambda target: enrich_website(
+                        session, target.id, target.website,
+                        timeout=config.ENRICH_TIMEOUT,
+                        max_bytes=config.ENRICH_MAX_BYTES
+                    )),
+                    batch
+                ))
+
+                db.bulk_update_mappings(Business, mappings)
+                db.commit()
+
+                for mapping in mappings:
+                    stats['processed'] += 1
+                    stats['alive'] += 1 if mapping.get('website_alive') else 0
+                    stats['emails'] += 1 if mapping.get('email') else 0
+                    stats['instagram'] += 1 if mapping.get('instagram') else 0
+                    stats['facebook'] += 1 if mapping.get('facebook') else 0
+
+                if progress:
+                    progress(stats['processed'], len(targets))
+
+        logger.info(f"Enriquecimento concluído: {stats}")
+        if stats['processed']:
+            # Site fora do ar altera a nota do lead
+            rescore_leads()
+        return {'success': True, **stats}
+
+    except Exception as e:
+        logger.error(f"Erro durante enriquecimento: {str(e)}")
+        return {'success': False, 'error': str(e), **stats}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    result = run_enrichment()
+    print(f"Resultado: {result}")
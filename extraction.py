@@ -0,0 +1,308 @@
+
+"""
+Extração dos campos de um lugar do Google Maps, independente da fonte.
+
+Os seletores e o parsing ficam aqui e são usados tanto pelo scraper ao vivo
+(SeleniumPage em scraper.py) quanto pelo replay de snapshots (HtmlPage, com
+html.parser da stdlib, sem navegador). Corrigir um seletor aqui vale para
+os dois caminhos.
+
+parse_places_payload() lê os mesmos campos das respostas JSON que a página
+de busca do Maps baixa durante o scroll (modo SCRAPER_EXTRACTION_MODE=network),
+sem abrir cada lugar.
+"""
+import json
+import re
+from html.parser import HTMLParser
+
+SELECTORS = {
+    'name': ['h1[data-attrid="title"]', '[data-section-id="oh"] h1'],
+    'phone': '[data-item-id*="phone"]',
+    'address': '[data-item-id="address"]',
+    'category': '[jsaction*="category"]',
+    'rating': '[jsaction*="pane.rating"]',
+    'website': '[data-item-id*="authority"]'
+}
+
+FIELDS = ('name', 'phone', 'address', 'category', 'rating', 'reviews_count', 'website')
+
+def parse_phone(item_ids):
+    """Telefone a partir dos data-item-id (formato 'phone:tel:+55...')"""
+    for item_id in item_ids:
+        if item_id and 'phone:tel:' in item_id:
+            return item_id.replace('phone:tel:', '')
+    return ''
+
+def parse_rating(text):
+    """(avaliação, número de avaliações) a partir de textos como '4,6 (1.234)'"""
+    rating, reviews_count = 0.0, 0
+    parts = (text or '').split()
+    if len(parts) >= 1:
+        rating = float(parts[0].replace(',', '.'))
+    if len(parts) >= 2:
+        reviews_text = parts[1].replace('(', '').replace(')', '').replace('.', '')
+        reviews_count = int(reviews_text) if reviews_text.isdigit() else 0
+    return rating, reviews_count
+
+def extract_fields(page):
+    """Extrai os dados do negócio de uma página (SeleniumPage ou HtmlPage)
+
+    Cada campo é independente: falha em um não impede os demais.
+    """
+    business_data = {
+        'name': '',
+        'phone': '',
+        'address': '',
+        'category': '',
+        'rating': 0.0,
+        'reviews_count': 0,
+        'website': ''
+    }
+
+    for selector in SELECTORS['name']:
+        name = (page.first_text(selector) or '').strip()
+        if name:
+            business_data['name'] = name
+            break
+
+    try:
+        business_data['phone'] = parse_phone(page.all_attrs(SELECTORS['phone'], 'data-item-id'))
+    except Exception:
+        pass
+
+    business_data['address'] = (page.first_text(SELECTORS['address']) or '').strip()
+    business_data['category'] = (page.first_text(SELECTORS['category']) or '').strip()
+
+    try:
+        business_data['rating'], business_data['reviews_count'] = parse_rating(page.first_text(SELECTORS['rating']))
+    except ValueError:
+        pass
+
+    business_data['website'] = page.first_attr(SELECTORS['website'], 'href') or ''
+
+    return business_data if business_data['name'] else None
+
+# Caminhos (índices) de cada campo dentro do array de um lugar no payload da
+# busca. O formato não é documentado: quando o Maps mudar, corrigir aqui. Mais
+# de um caminho = alternativas em ordem.
+PAYLOAD_PATHS = {
+    'name': [(11,)],
+    'address': [(39,), (2,)],
+    'category': [(13, 0)],
+    'rating': [(4, 7)],
+    'reviews_count': [(4, 8)],
+    'website': [(7, 0)],
+    'phone': [(178, 0, 0)]
+}
+
+# Identificador do lugar: '0x94dce4...:0x8f1c...' no payload e em "!1s..." na URL do card
+PLACE_ID_RE = re.compile(r'^0x[0-9a-f]+:0x[0-9a-f]+$')
+URL_PLACE_ID_RE = re.compile(r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)')
+PAYLOAD_PLACE_ID_INDEX = 10
+
+# Prefixo anti-JSON-hijacking das respostas do Google
+XSSI_PREFIX = ")]}'"
+
+def place_id_from_url(url):
+    match = URL_PLACE_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+def _payload_json(text):
+    """Decodifica o corpo da resposta: JSON direto ou envelope {"d": ")]}'..."}"""
+    text = text.strip()
+    if text.endswith('/*""*/'):
+        text = text[:-len('/*""*/')]
+    if text.startswith(XSSI_PREFIX):
+        text = text[len(XSSI_PREFIX):]
+    data = json.loads(text)
+    if isinstance(data, dict) and isinstance(data.get('d'), str):
+        return _payload_json(data['d'])
+    return data
+
+def _get_path(node, path):
+    for index in path:
+        if not isinstance(node, list) or index >= len(node) or node[index] is None:
+            return None
+        node = node[index]
+    return node
+
+def _is_place(node):
+    return (
+        len(node) > PAYLOAD_PLACE_ID_INDEX + 1
+        and isinstance(node[PAYLOAD_PLACE_ID_INDEX], str)
+        and PLACE_ID_RE.match(node[PAYLOAD_PLACE_ID_INDEX]) is not None
+        and isinstance(node[11], str)
+    )
+
+def _iter_places(data):
+    """Arrays com cara de lugar (id hex + nome), em qualquer profundidade do payload"""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, list):
+            continue
+        if _is_place(node):
+            yield node
+            continue
+        stack.extend(reversed(node))
+
+def _payload_field(place, field):
+    for path in PAYLOAD_PATHS[field]:
+        value = _get_path(place, path)
+        if isinstance(value, list):
+            value = ', '.join(str(part) for part in value if part)
+        if value not in (None, ''):
+            return value
+    return None
+
+def parse_places_payload(text):
+    """{place_id: business_data} de uma resposta de busca do Maps
+
+    Lugares sem nome são ignorados; erro de formato (JSON inválido) levanta
+    ValueError para o chamador cair no caminho do DOM.
+    """
+    places = {}
+    for place in _iter_places(_payload_json(text)):
+        name = (_payload_field(place, 'name') or '').strip()
+        if not name:
+            continue
+
+        rating = _payload_field(place, 'rating')
+        reviews_count = _payload_field(place, 'reviews_count')
+        places[place[PAYLOAD_PLACE_ID_INDEX]] = {
+            'name': name,
+            'phone': str(_payload_field(place, 'phone') or '').strip(),
+            'address': str(_payload_field(place, 'address') or '').strip(),
+            'category': str(_payload_field(place, 'category') or '').strip(),
+            'rating': float(rating) if isinstance(rating, (int, float)) else 0.0,
+            'reviews_count': int(reviews_count) if isinstance(reviews_count, (int, float)) else 0,
+            'website': str(_payload_field(place, 'website') or '').strip()
+        }
+    return places
+
+# Seletores CSS suportados pelo HtmlPage: tag, [attr], [attr="v"], [attr*="v"],
+# [attr^="v"], [attr$="v"], combinados, e o combinador de descendente (espaço)
+_COMPOUND_RE = re.compile(r'^([a-zA-Z0-9]*)((?:\[[^\]]+\])*)$')
+_ATTR_RE = re.compile(r'\[([\w:-]+)(?:([*^$]?=)"([^"]*)")?\]')
+_SPLIT_RE = re.compile(r'\s+(?=(?:[^"]*"[^"]*")*[^"]*$)')
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+SKIPPED_TEXT_TAGS = {'script', 'style', 'noscript', 'template'}
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'parent', 'children')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+    def iter(self):
+        """Elementos descendentes em ordem de documento"""
+        stack = list(reversed([child for child in self.children if isinstance(child, Element)]))
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(reversed([child for child in element.children if isinstance(child, Element)]))
+
+    def text(self):
+        """Texto visível aproximado (espaços normalizados, sem script/style)"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            elif node.tag not in SKIPPED_TEXT_TAGS:
+                stack.extend(reversed(node.children))
+        return ' '.join(' '.join(parts).split())
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {}, None)
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value or '' for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, {name: value or '' for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # Fecha até a tag correspondente; tags de fechamento órfãs são ignoradas
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+def _parse_compound(compound):
+    match = _COMPOUND_RE.match(compound)
+    if not match:
+        raise ValueError(f"Seletor não suportado: {compound}")
+    return match.group(1).lower(), _ATTR_RE.findall(match.group(2))
+
+def _matches(element, compound):
+    tag, conditions = compound
+    if tag and element.tag != tag:
+        return False
+    for name, operator, expected in conditions:
+        value = element.attrs.get(name)
+        if value is None:
+            return False
+        if operator == '=' and value != expected:
+            return False
+        if operator == '*=' and expected not in value:
+            return False
+        if operator == '^=' and not value.startswith(expected):
+            return False
+        if operator == '$=' and not value.endswith(expected):
+            return False
+    return True
+
+class HtmlPage:
+    """Página estática (snapshot) com a mesma interface do SeleniumPage"""
+    def __init__(self, html):
+        builder = _TreeBuilder()
+        builder.feed(html)
+        builder.close()
+        self.root = builder.root
+        self._selectors = {}
+
+    def _compile(self, selector):
+        if selector not in self._selectors:
+            self._selectors[selector] = [_parse_compound(part) for part in _SPLIT_RE.split(selector.strip())]
+        return self._selectors[selector]
+
+    def select(self, selector):
+        compounds = self._compile(selector)
+        *ancestors, target = compounds
+        for element in self.root.iter():
+            if not _matches(element, target):
+                continue
+            # Descendente: casar os seletores anteriores subindo pelos ancestrais
+            pending = list(ancestors)
+            node = element.parent
+            while pending and node is not None and node is not self.root:
+                if _matches(node, pending[-1]):
+                    pending.pop()
+                node = node.parent
+            if not pending:
+                yield element
+
+    def first_text(self, selector):
+        return next((element.text() for element in self.select(selector)), None)
+
+    def first_attr(self, selector, attr):
+        return next((element.attrs.get(attr) for element in self.select(selector)), None)
+
+    def all_attrs(self, selector, attr):
+        return [element.attrs.get(attr) for element in self.select(selector)]
@@ -0,0 +1,122 @@
+
+"""
+Camada de resposta HTTP: GET condicional e compressão.
+
+Rotas decoradas com @conditional calculam um ETag barato a partir de uma
+versão dos dados (ex: max(id) e max(updated_at) de businesses, ou o próprio
+estado dos jobs) antes de rodar a view. Se o cliente já tem essa versão
+(If-None-Match), a resposta é 304 sem executar as consultas pesadas. O
+navegador revalida sozinho nas chamadas fetch() das páginas.
+
+Respostas JSON/HTML acima de HTTP_COMPRESSION_MIN_BYTES são comprimidas
+com brotli (se o pacote `brotli` estiver instalado e o cliente aceitar) ou
+gzip.
+"""
+import gzip
+import hashlib
+import json
+from functools import wraps
+from flask import current_app, make_response, request
+from sqlalchemy import func, select
+from models import Business, SessionLocal
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript'
+}
+
+_brotli = None
+
+def _get_brotli():
+    """Módulo brotli, ou False se não estiver instalado (import só na primeira resposta)"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+def make_etag(*parts):
+    """Hash curto e estável das partes (qualquer coisa serializável em JSON)"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+def business_data_version():
+    """Versão da tabela businesses: dois lookups de índice (max id, max updated_at)"""
+    db = SessionLocal()
+    try:
+        return db.execute(select(
+            select(func.max(Business.id)).scalar_subquery(),
+            select(func.max(Business.updated_at)).scalar_subquery()
+        )).one()
+    finally:
+        db.close()
+
+def conditional(version, cache_control='no-cache'):
+    """Responde 304 quando If-None-Match casa com o ETag da versão atual
+
+    `version` é chamado antes da view e deve ser barato; o ETag combina a
+    versão com a rota e a query string. O ETag é fraco (W/) porque o mesmo
+    conteúdo pode sair com ou sem compressão.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(request.path, sorted(request.args.items(multi=True)), version())
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if accepted['br'] and _get_brotli():
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """after_request: comprime respostas textuais grandes conforme Accept-Encoding"""
+    config = current_app.config
+    if (
+        not config['HTTP_COMPRESSION']
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < config['HTTP_COMPRESSION_MIN_BYTES']:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding == 'br':
+        compressed = _get_brotli().compress(data, quality=config['HTTP_BROTLI_QUALITY'])
+    elif encoding == 'gzip':
+        compressed = gzip.compress(data, compresslevel=config['HTTP_GZIP_LEVEL'])
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_http_cache(app):
+    app.after_request(compress_response)
@@ -0,0 +1,387 @@
+
+"""
+Importação em massa de listas de leads (CSV, JSONL ou XLSX).
+
+O arquivo é lido em streaming (openpyxl em modo read-only para XLSX), as
+linhas são normalizadas e gravadas em lotes de IMPORT_CHUNK_SIZE com um
+commit por lote: executemany no SQLite e COPY no PostgreSQL (psycopg2).
+Telefones já existentes são pulados ou, com on_duplicate='update',
+completam os campos vazios do negócio existente. Linhas inválidas vão
+para um relatório CSV em export/.
+
+Uso: python importer.py leads.xlsx [--on-duplicate update] [--encoding latin-1]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+from sqlalchemy import bindparam, func, insert, select, update
+from models import Business, SessionLocal, engine, init_db
+from config import get_config
+from log_config import setup_logging
+from suppression import normalize_phone
+from address_parser import ADDRESS_FIELDS, parse_address
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalhos aceitos (sem acento, minúsculos) -> coluna de Business
+COLUMN_ALIASES = {
+    'name': ('nome', 'name', 'empresa', 'nome fantasia', 'razao social', 'negocio'),
+    'phone': ('telefone', 'phone', 'whatsapp', 'celular', 'fone', 'tel'),
+    'address': ('endereco', 'address', 'logradouro'),
+    'category': ('categoria', 'category', 'segmento', 'ramo'),
+    'rating': ('avaliacao', 'rating', 'nota'),
+    'reviews_count': ('numero de avaliacoes', 'reviews', 'reviews_count', 'avaliacoes'),
+    'website': ('website', 'site', 'url'),
+    'email': ('e-mail', 'email'),
+    'instagram': ('instagram',),
+    'facebook': ('facebook',)
+}
+
+# Tamanho máximo das colunas String de Business
+MAX_LENGTHS = {'name': 255, 'phone': 50, 'category': 100, 'website': 255, 'email': 255,
+               'instagram': 255, 'facebook': 255, 'scraped_keyword': 100}
+
+# Campos preenchidos em negócios existentes com on_duplicate='update'
+UPDATABLE_FIELDS = ('address', 'category', 'rating', 'reviews_count', 'website', 'email', 'instagram', 'facebook',
+                    *ADDRESS_FIELDS)
+
+NUMERIC_FIELDS = ('rating', 'reviews_count')
+
+# Inteiro com milhar pt-BR sem decimais ("1.234", "12.345.678")
+PT_BR_THOUSANDS_RE = re.compile(r'\d{1,3}(\.\d{3})+')
+
+# NULL do COPY: todo valor vai entre aspas, então o marcador sem aspas não colide com dados
+COPY_NULL = r'\N'
+
+# Máximo de linhas com erro devolvidas na resposta (o relatório CSV tem todas)
+MAX_REPORTED_ERRORS = 20
+
+def _header_key(value):
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(text.lower().replace('_', ' ').split())
+
+def map_header(header):
+    """Índice da coluna de origem para cada campo de Business reconhecido"""
+    keys = [_header_key(cell) for cell in header]
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in keys:
+                mapping[field] = keys.index(alias)
+                break
+    return mapping
+
+def _text_stream(stream, encoding):
+    if isinstance(stream, (bytes, bytearray)):
+        return io.StringIO(bytes(stream).decode(encoding))
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline='')
+
+def iter_csv_rows(stream, encoding='utf-8-sig'):
+    """Linhas do CSV como dicts campo -> valor (separador , ou ; detectado)"""
+    text = _text_stream(stream, encoding)
+    # Amostra com linhas completas para o Sniffer; depois é relida antes do resto
+    sample = text.read(65536)
+    sample += text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(_chain(sample, text), dialect)
+
+    mapping = map_header(next(reader, []))
+    for row in reader:
+        if row:
+            yield {field: row[index] if index < len(row) else None for field, index in mapping.items()}
+
+def _chain(sample, text):
+    """Amostra lida pelo Sniffer seguida do resto do arquivo, linha a linha"""
+    yield from io.StringIO(sample)
+    yield from text
+
+def iter_jsonl_rows(stream, encoding='utf-8-sig'):
+    """Um objeto JSON por linha; as chaves passam pelo mesmo mapeamento de cabeçalhos"""
+    mapping_cache = {}
+    for line in _text_stream(stream, encoding):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {'__error__': f"JSON inválido: {e}"}
+            continue
+        keys = tuple(record)
+        if keys not in mapping_cache:
+            mapping_cache[keys] = map_header(keys)
+        yield {field: record[keys[index]] for field, index in mapping_cache[keys].items()}
+
+def iter_xlsx_rows(stream):
+    """Linhas da primeira planilha, sem carregar o arquivo inteiro na memória"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        mapping = map_header(next(rows, ()))
+        for row in rows:
+            if row and any(cell is not None for cell in row):
+                yield {field: row[index] if index < len(row) else None for field, index in mapping.items()}
+    finally:
+        workbook.close()
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return 'xlsx'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def parse_number(value):
+    """Número de uma célula: valores numéricos (JSON, XLSX) passam direto; texto pode ser pt-BR
+
+    "1.234,5" e "1.234" são pt-BR (ponto de milhar); "1234.5" sem vírgula é ponto decimal.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = str(value).strip().replace(' ', '')
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    elif PT_BR_THOUSANDS_RE.fullmatch(text):
+        text = text.replace('.', '')
+    return float(text)
+
+def normalize_row(raw, source, now):
+    """Converte uma linha de origem em colunas de Business; levanta ValueError se inválida"""
+    if '__error__' in raw:
+        raise ValueError(raw['__error__'])
+
+    record = {field: _clean(raw.get(field)) for field in COLUMN_ALIASES}
+    if not record['name']:
+        raise ValueError("nome vazio")
+
+    if record['rating'] is not None:
+        try:
+            rating = float(parse_number(raw['rating']))
+        except ValueError:
+            raise ValueError(f"avaliação inválida: {record['rating']}")
+        if not 0 <= rating <= 5:
+            raise ValueError(f"avaliação fora de 0-5: {record['rating']}")
+        record['rating'] = rating
+
+    if record['reviews_count'] is not None:
+        try:
+            record['reviews_count'] = int(parse_number(raw['reviews_count']))
+        except (ValueError, OverflowError):
+            raise ValueError(f"número de avaliações inválido: {record['reviews_count']}")
+
+    if record['email']:
+        record['email'] = record['email'].lower()
+
+    for field, length in MAX_LENGTHS.items():
+        if record.get(field) and len(record[field]) > length:
+            record[field] = record[field][:length]
+
+    record['phone_normalized'] = normalize_phone(record['phone'])
+    record.update(parse_address(record['address']))
+    record['scraped_keyword'] = source[:MAX_LENGTHS['scraped_keyword']]
+    record['lead_score'] = 0
+    record['created_at'] = now
+    record['updated_at'] = now
+    return record
+
+def _copy_field(value):
+    if value is None:
+        return COPY_NULL
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_rows(db, records, columns):
+    """COPY FROM STDIN no PostgreSQL (psycopg2): o caminho mais rápido de carga
+
+    None vira o marcador COPY_NULL e strings vazias continuam '' (como no
+    executemany do SQLite e no ORM), já que valores entre aspas nunca são NULL.
+    """
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(','.join(_copy_field(record.get(column)) for column in columns) + '\n')
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {Business.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer
+    )
+
+def _insert_rows(db, records):
+    if not records:
+        return
+    columns = list(records[0])
+    if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+        _copy_rows(db, records, columns)
+    else:
+        db.execute(insert(Business.__table__), records)
+
+def _update_rows(db, records):
+    """Completa campos vazios dos negócios existentes (casados por telefone)"""
+    if not records:
+        return
+    table = Business.__table__
+    statement = update(table).where(table.c.phone_normalized == bindparam('match_phone')).values({
+        field: func.coalesce(
+            table.c[field] if field in NUMERIC_FIELDS else func.nullif(table.c[field], ''),
+            bindparam(f'new_{field}')
+        )
+        for field in UPDATABLE_FIELDS
+    })
+    db.execute(statement, [
+        {'match_phone': record['phone_normalized'], **{f'new_{field}': record[field] for field in UPDATABLE_FIELDS}}
+        for record in records
+    ])
+
+class ErrorReport:
+    """Relatório CSV das linhas rejeitadas, gravado à medida que os erros aparecem"""
+    def __init__(self):
+        self.filename = None
+        self.samples = []
+        self._file = None
+        self._writer = None
+
+    def add(self, line, error, raw):
+        if self._writer is None:
+            os.makedirs('export', exist_ok=True)
+            self.filename = f"export/import_erros_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            self._file = open(self.filename, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['linha', 'erro', 'dados'])
+        self._writer.writerow([line, error, json.dumps(raw, default=str, ensure_ascii=False)])
+        if len(self.samples) < MAX_REPORTED_ERRORS:
+            self.samples.append({'line': line, 'error': error})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+def import_leads(stream, filename=None, file_format=None, on_duplicate='skip', encoding='utf-8-sig',
+                 chunk_size=None, progress=None):
+    """Importa uma lista de leads em lotes; retorna contagens e o relatório de erros"""
+    init_db()
+    config = get_config()
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    file_format = file_format or detect_format(filename)
+    source = f"import:{os.path.basename(filename or file_format)}"
+    started = time.perf_counter()
+    now = datetime.now()
+
+    if file_format == 'xlsx':
+        rows = iter_xlsx_rows(stream)
+    elif file_format == 'jsonl':
+        rows = iter_jsonl_rows(stream, encoding)
+    else:
+        rows = iter_csv_rows(stream, encoding)
+
+    db = SessionLocal()
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'duplicates': 0, 'errors': 0}
+    errors = ErrorReport()
+    seen_phones = set()
+
+    def flush(chunk):
+        # Telefones já cadastrados: pular ou completar o existente
+        phones = [record['phone_normalized'] for record in chunk if record['phone_normalized']]
+        existing = set(db.execute(
+            select(Business.phone_normalized).where(Business.phone_normalized.in_(phones))
+        ).scalars()) if phones else set()
+
+        new_records = [record for record in chunk if record['phone_normalized'] not in existing]
+        duplicates = [record for record in chunk if record['phone_normalized'] in existing]
+
+        _insert_rows(db, new_records)
+        if on_duplicate == 'update':
+            _update_rows(db, duplicates)
+            stats['updated'] += len(duplicates)
+        else:
+            stats['duplicates'] += len(duplicates)
+        db.commit()
+
+        stats['inserted'] += len(new_records)
+        if progress:
+            progress(stats)
+
+    try:
+        chunk = []
+        # Linha 1 é o cabeçalho (exceto JSONL)
+        first_line = 1 if file_format == 'jsonl' else 2
+        for line, raw in enumerate(rows, start=first_line):
+            stats['rows'] += 1
+            try:
+                record = normalize_row(raw, source, now)
+            except (ValueError, TypeError) as e:
+                stats['errors'] += 1
+                errors.add(line, str(e), raw)
+                continue
+
+            # Telefone repetido dentro do próprio arquivo
+            phone = record['phone_normalized']
+            if phone:
+                if phone in seen_phones:
+                    stats['duplicates'] += 1
+                    continue
+                seen_phones.add(phone)
+
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+
+        if chunk:
+            flush(chunk)
+
+        errors.close()
+        stats['error_report'] = errors.filename
+        stats['error_samples'] = errors.samples
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+        logger.info(f"Importação {source} concluída: { {k: v for k, v in stats.items() if k != 'error_samples'} }")
+
+        if stats['inserted'] or stats['updated']:
+            from lead_scoring import rescore_leads
+            rescore_leads()
+
+        return {'success': True, **stats}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro na importação {source}: {str(e)}")
+        return {'success': False, 'error': str(e), **stats}
+    finally:
+        errors.close()
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Importa lista de leads (CSV, JSONL ou XLSX)')
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'xlsx'])
+    parser.add_argument('--on-duplicate', choices=['skip', 'update'], default='skip')
+    parser.add_argument('--encoding', default='utf-8-sig')
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as f:
+        result = import_leads(f, filename=args.file, file_format=args.format,
+                              on_duplicate=args.on_duplicate, encoding=args.encoding,
+                              progress=lambda stats: logger.info(f"{stats['rows']} linhas lidas"))
+    print(f"Resultado: {result}")
@@ -0,0 +1,161 @@
+
+"""
+Pontuação de leads para priorizar campanhas.
+
+Carrega avaliação, número de avaliações, presença de website, categoria e
+data de captura de todos os negócios em arrays NumPy, calcula uma nota
+ponderada (0-100) em uma única passada vetorizada e grava em
+businesses.lead_score. A seleção de campanhas ordena por essa coluna, pelo
+índice ix_businesses_lead_score_rank.
+"""
+import logging
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import bindparam, select, text, update
+from models import Business, SessionLocal, init_db
+from config import get_config
+from log_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Linhas por executemany ao gravar as notas
+WRITE_CHUNK_SIZE = 10000
+
+DEFAULT_WEIGHTS = {
+    'rating': 0.30,
+    'reviews': 0.30,
+    'website': 0.15,
+    'category': 0.10,
+    'recency': 0.15
+}
+
+# Peso de categoria para quando nenhuma regra de LEAD_CATEGORY_WEIGHTS casar
+DEFAULT_CATEGORY_WEIGHT = 0.5
+
+def load_features(db):
+    """Lê as colunas usadas na pontuação como arrays NumPy"""
+    rows = db.execute(select(
+        Business.id,
+        Business.rating,
+        Business.reviews_count,
+        Business.website,
+        Business.website_alive,
+        Business.category,
+        Business.created_at,
+        Business.lead_score
+    )).all()
+
+    if not rows:
+        return None
+
+    ids, ratings, reviews, websites, alive, categories, created, current_scores = zip(*rows)
+    now = datetime.now()
+
+    return {
+        'id': np.fromiter(ids, dtype=np.int64, count=len(ids)),
+        'rating': np.array(ratings, dtype=np.float64),
+        'reviews': np.array(reviews, dtype=np.float64),
+        # Site fora do ar conta como sem site
+        'website': np.fromiter(
+            (1.0 if site and is_alive is not False else 0.0 for site, is_alive in zip(websites, alive)),
+            dtype=np.float64, count=len(ids)
+        ),
+        'category': np.array([(category or '').lower() for category in categories], dtype=object),
+        'age_days': np.fromiter(
+            ((now - moment).total_seconds() / 86400 if moment else np.nan for moment in created),
+            dtype=np.float64, count=len(ids)
+        ),
+        'current_score': np.array(current_scores, dtype=np.float64)
+    }
+
+def category_weights(categories, rules):
+    """Peso por categoria: a primeira regra (substring) que casar define o peso"""
+    uniques, inverse = np.unique(categories, return_inverse=True)
+    unique_weights = np.full(len(uniques), DEFAULT_CATEGORY_WEIGHT)
+
+    for i, category in enumerate(uniques):
+        for pattern, weight in rules.items():
+            if pattern.lower() in category:
+                unique_weights[i] = weight
+                break
+
+    return unique_weights[inverse]
+
+def compute_scores(features, weights=None, category_rules=None, recency_half_life_days=90):
+    """Nota 0-100 por negócio, calculada de forma vetorizada"""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+
+    rating = np.clip(np.nan_to_num(features['rating']) / 5.0, 0, 1)
+
+    reviews = np.nan_to_num(features['reviews'])
+    max_reviews = reviews.max() if reviews.size else 0
+    reviews = np.log1p(reviews) / np.log1p(max_reviews) if max_reviews > 0 else np.zeros_like(reviews)
+
+    recency = np.exp(-np.log(2) * np.nan_to_num(features['age_days'], nan=np.inf) / recency_half_life_days)
+
+    components = {
+        'rating': rating,
+        'reviews': reviews,
+        'website': features['website'],
+        'category': category_weights(features['category'], category_rules or {}),
+        'recency': recency
+    }
+
+    total_weight = sum(weights[name] for name in components) or 1.0
+    score = sum(weights[name] * values for name, values in components.items())
+    return np.round(100 * score / total_weight, 2)
+
+def rescore_leads():
+    """Recalcula e grava lead_score de todos os negócios"""
+    init_db()
+    config = get_config()
+    started = time.perf_counter()
+    db = SessionLocal()
+
+    try:
+        features = load_features(db)
+        if features is None:
+            return {'success': True, 'scored': 0}
+
+        scores = compute_scores(
+            features,
+            weights=config.LEAD_SCORE_WEIGHTS,
+            category_rules=config.LEAD_CATEGORY_WEIGHTS,
+            recency_half_life_days=config.LEAD_RECENCY_HALF_LIFE_DAYS
+        )
+
+        # Gravar apenas as notas que mudaram, via executemany no Core
+        changed = scores != features['current_score']
+        ids = features['id'][changed].tolist()
+        values = scores[changed].tolist()
+
+        table = Business.__table__
+        statement = update(table).where(table.c.id == bindparam('b_id')).values(lead_score=bindparam('b_score'))
+        for start in range(0, len(ids), WRITE_CHUNK_SIZE):
+            db.execute(statement, [
+                {'b_id': business_id, 'b_score': score}
+                for business_id, score in zip(ids[start:start + WRITE_CHUNK_SIZE], values[start:start + WRITE_CHUNK_SIZE])
+            ])
+        db.commit()
+
+        # Estatísticas atualizadas para o planejador escolher o índice de ordem
+        # das campanhas (sem elas o SQLite prefere last_contacted_at IS NULL e ordena tudo)
+        if ids:
+            db.execute(text(f'ANALYZE {Business.__tablename__}'))
+            db.commit()
+
+        elapsed = round(time.perf_counter() - started, 2)
+        logger.info(f"Lead score recalculado para {len(scores)} negócios ({len(ids)} alterados) em {elapsed}s")
+        return {'success': True, 'scored': len(scores), 'updated': len(ids), 'seconds': elapsed}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao recalcular lead score: {str(e)}")
+        return {'success': False, 'error': str(e)}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    print(f"Resultado: {rescore_leads()}")
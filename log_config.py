@@ -0,0 +1,185 @@
+
+"""
+Configuração única de logging.
+
+Os loggers do processo só enfileiram registros (QueueHandler); uma thread
+(QueueListener) formata e grava no arquivo com rotação por tamanho e no
+console, então os loops de scraping e envio não bloqueiam em I/O.
+
+Cada registro leva o contexto do job corrente (scraping_job, keyword,
+campaign_id, enrichment_job...) definido com log_context(). Mensagens de
+alto volume podem ser amostradas por módulo (LOG_SAMPLING).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import get_config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Campos padrão de LogRecord que não vão para o JSON como extras
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'context'}
+
+_context = contextvars.ContextVar('log_context', default={})
+_listener = None
+_setup_lock = threading.Lock()
+
+@contextmanager
+def log_context(**fields):
+    """Acrescenta campos (ex: campaign_id) a todos os logs emitidos dentro do bloco"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def job_context(name):
+    """Decorator: cada chamada roda com um id de job novo no contexto de log (ex: scraping_job)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with log_context(**{name: uuid.uuid4().hex[:12]}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def propagate_context(fn):
+    """Embrulha fn para rodar em outra thread com o contexto de log atual"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+class ContextFilter(logging.Filter):
+    """Copia o contexto do job para o registro na thread que emitiu o log"""
+    def filter(self, record):
+        record.context = _context.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Amostra logs INFO/DEBUG de alto volume por ponto de chamada
+
+    Em cada janela, as primeiras `burst` mensagens de um mesmo ponto de
+    chamada passam; depois, 1 a cada `rate`. WARNING e acima sempre passam.
+    """
+    def __init__(self, rates, burst=20, window=60):
+        super().__init__()
+        self.rates = rates
+        self.burst = burst
+        self.window = window
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _rate(self, name):
+        module = name.split('.')[0]
+        return self.rates.get(name) or self.rates.get(module) or 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            started, count = self.counters.get(key, (now, 0))
+            if now - started > self.window:
+                started, count = now, 0
+            self.counters[key] = (started, count + 1)
+
+        if count < self.burst:
+            return True
+        if (count - self.burst) % rate == 0:
+            record.sample_rate = rate
+            return True
+        return False
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha, com contexto do job e campos extras"""
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        payload.update(getattr(record, 'context', {}))
+        payload.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class ContextTextFormatter(logging.Formatter):
+    """Formato texto do console, com o contexto do job no final"""
+    def format(self, record):
+        line = super().format(record)
+        context = getattr(record, 'context', None)
+        if context:
+            line += ' [' + ' '.join(f"{key}={value}" for key, value in context.items()) + ']'
+        return line
+
+def setup_logging(level=None, log_file=None):
+    """Instala o pipeline de logging no logger raiz (uma vez por processo)"""
+    global _listener
+    config = get_config()
+
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        handlers = []
+
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter() if config.LOG_FORMAT == 'json' else ContextTextFormatter(TEXT_FORMAT))
+        handlers.append(console)
+
+        log_file = config.LOG_FILE if log_file is None else log_file
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=config.LOG_MAX_BYTES,
+                backupCount=config.LOG_BACKUP_COUNT,
+                encoding='utf-8'
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        if config.LOG_SAMPLING:
+            queue_handler.addFilter(SamplingFilter(config.LOG_SAMPLING, burst=config.LOG_SAMPLE_BURST))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(getattr(logging, (level or config.LOG_LEVEL).upper()))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+def shutdown_logging():
+    """Esvazia a fila e para a thread de escrita"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
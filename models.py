@@ -1,5 +1,5 @@
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, Boolean
+from sqlalchemy import create_engine, inspect, text, Column, Index, Integer, String, Date, DateTime, Float, Text, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -13,7 +13,14 @@ class Business(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
     phone = Column(String(50))
+    phone_normalized = Column(String(20), index=True)
     address = Column(Text)
+    # Partes do endereço para filtros indexados (address_parser.py); cep '' = processado sem CEP
+    cep = Column(String(8), index=True)
+    neighborhood = Column(String(100))
+    neighborhood_key = Column(String(100), index=True)
+    street = Column(String(255))
+    street_key = Column(String(255), index=True)
     category = Column(String(100))
     rating = Column(Float)
     reviews_count = Column(Integer)
@@ -21,17 +28,40 @@ class Business(Base):
     created_at = Column(DateTime, default=datetime.now)
     scraped_keyword = Column(String(100))
     
+    # Enriquecimento pelo website (enrichment.py)
+    email = Column(String(255))
+    instagram = Column(String(255))
+    facebook = Column(String(255))
+    website_alive = Column(Boolean)
+    website_status = Column(Integer)
+    enriched_at = Column(DateTime, index=True)
+    
+    # Prioridade nas campanhas (lead_scoring.py); 0 até a primeira pontuação
+    lead_score = Column(Float, nullable=False, default=0, server_default='0')
+    
+    # Versão dos dados para ETags da API (http_cache.py)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+    
+    # Estado de contato; continua valendo depois que message_logs é arquivado (retention.py)
+    last_contacted_at = Column(DateTime, index=True)
+    
+# Ordem das campanhas (lead_score DESC, id): o ORDER BY ... LIMIT n lê o índice
+# na ordem, sem ordenar os elegíveis
+Index('ix_businesses_lead_score_rank', Business.lead_score.desc(), Business.id)
+
 class MessageLog(Base):
     __tablename__ = 'message_logs'
     
     id = Column(Integer, primary_key=True)
-    business_id = Column(Integer)
+    business_id = Column(Integer, index=True)
     business_name = Column(String(255))
     phone = Column(String(50))
     message_sent = Column(Boolean, default=False)
     sent_at = Column(DateTime)
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.now)
+    # Envio ainda na fila do serviço do WhatsApp (whatsapp_service.py); limpo quando termina
+    pending_job_id = Column(String(32), index=True)
 
 class ScrapingSession(Base):
     __tablename__ = 'scraping_sessions'
@@ -43,6 +73,89 @@ class ScrapingSession(Base):
     started_at = Column(DateTime, default=datetime.now)
     completed_at = Column(DateTime)
     status = Column(String(50), default='running')
+    
+    # Falhas por classe de erro (scraper.py)
+    timeout_errors = Column(Integer, default=0)
+    driver_errors = Column(Integer, default=0)
+    extraction_errors = Column(Integer, default=0)
+    retry_count = Column(Integer, default=0)
+    driver_restarts = Column(Integer, default=0)
+
+class PageSnapshot(Base):
+    """HTML do painel de detalhes capturado no scraping (snapshots.py)"""
+    __tablename__ = 'page_snapshots'
+    
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, index=True)
+    business_id = Column(Integer, index=True)
+    url = Column(Text)
+    content_hash = Column(String(64), index=True)
+    size_bytes = Column(Integer)
+    captured_at = Column(DateTime, default=datetime.now)
+
+# Tabelas de arquivo (retention.py). No PostgreSQL são particionadas por mês;
+# a coluna de partição precisa fazer parte da chave primária.
+class MessageLogArchive(Base):
+    __tablename__ = 'message_logs_archive'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    business_id = Column(Integer, index=True)
+    business_name = Column(String(255))
+    phone = Column(String(50))
+    message_sent = Column(Boolean, default=False)
+    sent_at = Column(DateTime)
+    error_message = Column(Text)
+    created_at = Column(DateTime, primary_key=True)
+    pending_job_id = Column(String(32))
+    archived_at = Column(DateTime, default=datetime.now)
+
+class ScrapingSessionArchive(Base):
+    __tablename__ = 'scraping_sessions_archive'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (started_at)'}
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    keyword = Column(String(100))
+    total_found = Column(Integer)
+    successful_scrapes = Column(Integer)
+    started_at = Column(DateTime, primary_key=True)
+    completed_at = Column(DateTime)
+    status = Column(String(50))
+    timeout_errors = Column(Integer)
+    driver_errors = Column(Integer)
+    extraction_errors = Column(Integer)
+    retry_count = Column(Integer)
+    driver_restarts = Column(Integer)
+    archived_at = Column(DateTime, default=datetime.now)
+
+class MessageDailyStat(Base):
+    """Totais diários de mensagens já arquivadas (mantém relatórios corretos)"""
+    __tablename__ = 'message_daily_stats'
+    
+    day = Column(Date, primary_key=True)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+
+class SuppressedPhone(Base):
+    __tablename__ = 'suppressed_phones'
+    
+    id = Column(Integer, primary_key=True)
+    phone = Column(String(20), nullable=False, unique=True, index=True)
+    reason = Column(String(255))
+    created_at = Column(DateTime, default=datetime.now)
+
+class CampaignPreview(Base):
+    __tablename__ = 'campaign_previews'
+    
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(32), index=True)
+    position = Column(Integer)
+    business_id = Column(Integer)
+    business_name = Column(String(255))
+    phone = Column(String(50))
+    message = Column(Text)
+    scheduled_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.now)
 
 # Database setup
 from config import get_config
@@ -52,9 +165,52 @@ DATABASE_URL = config.DATABASE_URL
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _ensure_columns():
+    """Adiciona colunas e índices novos em tabelas já existentes (create_all não altera tabelas)"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name']: col for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    # Com DEFAULT o próprio banco preenche as linhas existentes
+                    if column.server_default is not None:
+                        ddl += f' DEFAULT {column.server_default.arg}'
+                        if not column.nullable:
+                            ddl += ' NOT NULL'
+                    conn.execute(text(ddl))
+                elif (
+                    not column.nullable and column.server_default is not None
+                    and existing[column.name]['nullable'] and engine.dialect.name == 'postgresql'
+                ):
+                    # Coluna antiga que passou a NOT NULL: preenche e trava uma única vez. O SQLite
+                    # não altera colunas; lá o NULL legado já ordena por último em DESC
+                    conn.execute(text(
+                        f'UPDATE {table.name} SET {column.name} = {column.server_default.arg} '
+                        f'WHERE {column.name} IS NULL'
+                    ))
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column.name} SET DEFAULT {column.server_default.arg}, '
+                        f'ALTER COLUMN {column.name} SET NOT NULL'
+                    ))
+                # Índices novos em colunas antigas também não são criados por create_all
+                if column.index:
+                    conn.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'
+                    ))
+            # Índices compostos declarados fora das colunas
+            for index in table.indexes:
+                if not any(column.index for column in index.columns):
+                    index.create(conn, checkfirst=True)
+
 def init_db():
     os.makedirs('data', exist_ok=True)
     Base.metadata.create_all(bind=engine)
+    _ensure_columns()
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,220 @@
+
+"""
+Retenção e arquivamento de histórico.
+
+message_logs e scraping_sessions crescem para sempre e são lidas pelo
+dashboard, relatórios e seleção de campanhas. Linhas mais antigas que
+RETENTION_MESSAGE_LOG_DAYS / RETENTION_SESSION_DAYS são movidas em lotes
+para tabelas *_archive (particionadas por mês no PostgreSQL) ou para
+arquivos JSONL gzip mensais em RETENTION_ARCHIVE_DIR.
+
+Antes de mover mensagens, o estado de contato (businesses.last_contacted_at)
+e os totais diários (message_daily_stats) são atualizados, então campanhas
+e relatórios continuam corretos sem ler o histórico arquivado.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text, update
+from models import (
+    Business, MessageLog, ScrapingSession, MessageLogArchive, ScrapingSessionArchive,
+    MessageDailyStat, SessionLocal, engine, init_db
+)
+from config import get_config
+from log_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def _month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(moment):
+    return _month_start(moment + timedelta(days=32))
+
+def ensure_month_partitions(db, table_name, moments):
+    """Cria (se faltar) a partição mensal de cada data; só no PostgreSQL"""
+    if engine.dialect.name != 'postgresql':
+        return
+
+    for month in {_month_start(moment) for moment in moments}:
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table_name}_{month:%Y_%m} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        ))
+
+def backfill_contact_state(db):
+    """Preenche last_contacted_at a partir das mensagens enviadas ainda em message_logs"""
+    last_sent = select(func.max(func.coalesce(MessageLog.sent_at, MessageLog.created_at))).where(
+        MessageLog.business_id == Business.id,
+        MessageLog.message_sent == True
+    ).scalar_subquery()
+
+    sent_ids = select(MessageLog.business_id).where(MessageLog.message_sent == True)
+
+    result = db.execute(
+        update(Business)
+        .where(Business.last_contacted_at.is_(None), Business.id.in_(sent_ids))
+        .values(last_contacted_at=last_sent)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+def _rollup_messages(db, rows):
+    """Soma as mensagens do lote em message_daily_stats"""
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        day = (row['sent_at'] or row['created_at']).date()
+        totals[day][0 if row['message_sent'] else 1] += 1
+
+    for day, (sent, failed) in totals.items():
+        stat = db.get(MessageDailyStat, day)
+        if stat is None:
+            db.add(MessageDailyStat(day=day, sent=sent, failed=failed))
+        else:
+            stat.sent += sent
+            stat.failed += failed
+
+def _append_jsonl(archive_dir, table_name, date_column, rows):
+    """Acrescenta as linhas ao arquivo gzip do mês (um membro gzip por lote)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[row[date_column].strftime('%Y-%m')].append(row)
+
+    for month, month_rows in by_month.items():
+        path = os.path.join(archive_dir, f"{table_name}-{month}.jsonl.gz")
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in month_rows:
+                f.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+
+def archive_table(db, model, archive_model, date_column, cutoff, target='table', archive_dir='data/archive',
+                  batch_size=5000, extra_filters=(), on_batch=None):
+    """Move em lotes as linhas com date_column < cutoff; retorna quantas foram movidas"""
+    table = model.__table__
+    date_col = table.c[date_column]
+    columns = [column.name for column in table.columns]
+    moved = 0
+
+    while True:
+        rows = [
+            dict(row._mapping) for row in db.execute(
+                select(*table.c).where(date_col < cutoff, *extra_filters).order_by(table.c.id).limit(batch_size)
+            )
+        ]
+        if not rows:
+            break
+
+        if on_batch:
+            on_batch(db, rows)
+
+        if target == 'file':
+            # Gravado antes do commit: uma falha aqui deixa as linhas na tabela quente
+            _append_jsonl(archive_dir, table.name, date_column, rows)
+        else:
+            ensure_month_partitions(db, archive_model.__tablename__, [row[date_column] for row in rows])
+            db.execute(insert(archive_model.__table__), [{name: row[name] for name in columns} for row in rows])
+
+        db.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+        db.commit()
+        moved += len(rows)
+
+    return moved
+
+def run_retention(now=None):
+    """Arquiva mensagens e sessões de scraping antigas conforme a configuração"""
+    init_db()
+    config = get_config()
+    now = now or datetime.now()
+    started = time.perf_counter()
+    db = SessionLocal()
+    stats = {'message_logs': 0, 'scraping_sessions': 0, 'contacts_backfilled': 0}
+
+    try:
+        options = {
+            'target': config.RETENTION_TARGET,
+            'archive_dir': config.RETENTION_ARCHIVE_DIR,
+            'batch_size': config.RETENTION_BATCH_SIZE
+        }
+
+        if config.RETENTION_MESSAGE_LOG_DAYS > 0:
+            # Estado de contato primeiro: a seleção de campanhas depende dele
+            stats['contacts_backfilled'] = backfill_contact_state(db)
+            stats['message_logs'] = archive_table(
+                db, MessageLog, MessageLogArchive, 'created_at',
+                now - timedelta(days=config.RETENTION_MESSAGE_LOG_DAYS),
+                extra_filters=(MessageLog.pending_job_id.is_(None),),
+                on_batch=_rollup_messages, **options
+            )
+
+        if config.RETENTION_SESSION_DAYS > 0:
+            stats['scraping_sessions'] = archive_table(
+                db, ScrapingSession, ScrapingSessionArchive, 'started_at',
+                now - timedelta(days=config.RETENTION_SESSION_DAYS),
+                extra_filters=(ScrapingSession.status != 'running',), **options
+            )
+
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+        logger.info(f"Retenção concluída: {stats}")
+        return {'success': True, **stats}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro durante retenção: {str(e)}")
+        return {'success': False, 'error': str(e), **stats}
+    finally:
+        db.close()
+
+def messages_sent_total(db):
+    """Mensagens enviadas: tabela quente + totais arquivados"""
+    hot = db.query(MessageLog).filter(MessageLog.message_sent == True).count()
+    archived = db.query(func.coalesce(func.sum(MessageDailyStat.sent), 0)).scalar()
+    return hot + archived
+
+def messages_sent_by_day(db):
+    """Lista [(dia 'YYYY-MM-DD', enviadas)] juntando tabela quente e totais arquivados"""
+    totals = defaultdict(int)
+
+    for day, sent in db.query(MessageDailyStat.day, MessageDailyStat.sent).filter(MessageDailyStat.sent > 0):
+        totals[str(day)] += sent
+
+    hot = db.query(
+        func.date(MessageLog.sent_at),
+        func.count(MessageLog.id)
+    ).filter(MessageLog.message_sent == True).group_by(func.date(MessageLog.sent_at))
+    for day, sent in hot:
+        totals[str(day)] += sent
+
+    return sorted(totals.items())
+
+def start_retention_scheduler():
+    """Agenda run_retention diariamente em RETENTION_SCHEDULE_HOUR (uma vez por processo)"""
+    global _scheduler
+    config = get_config()
+    if not config.RETENTION_SCHEDULER_ENABLED:
+        return None
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            _scheduler = BackgroundScheduler(daemon=True)
+            _scheduler.add_job(
+                run_retention, 'cron', hour=config.RETENTION_SCHEDULE_HOUR,
+                id='retention', max_instances=1, coalesce=True, replace_existing=True
+            )
+            _scheduler.start()
+            logger.info(f"Retenção agendada diariamente às {config.RETENTION_SCHEDULE_HOUR}h")
+        return _scheduler
+
+if __name__ == "__main__":
+    setup_logging()
+    print(f"Resultado: {run_retention()}")
@@ -0,0 +1,270 @@
+
+"""
+Despachante de campanhas com ritmo controlado por temporizador.
+
+Em vez de uma thread dormindo entre mensagens para cada campanha, um
+único worker mantém um heap com o próximo horário de envio de cada
+campanha e acorda apenas quando algum envio vence. Várias campanhas
+compartilham o mesmo worker (e o mesmo navegador), cada uma com seu
+próprio ritmo e horário de silêncio.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from models import Business, SessionLocal
+from campaign import next_allowed_time
+from suppression import load_suppressed_phones
+from config import get_config
+from log_config import log_context
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) entre conferências de envios na fila do serviço do
+# WhatsApp quando a campanha não tem mais alvos, só resultados pendentes
+SETTLE_INTERVAL = 5
+
+class Campaign:
+    def __init__(self, business_ids, messages_per_hour=10, quiet_hours=(None, None),
+                 test_mode=False, on_complete=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.pending = deque(business_ids)
+        self.interval = 3600 / messages_per_hour
+        self.quiet_start, self.quiet_end = quiet_hours
+        self.test_mode = test_mode
+        self.on_complete = on_complete
+        self.suppressed_phones = None
+        # Envios na fila do serviço do WhatsApp ainda sem resultado: id do job -> horário
+        self.outstanding = {}
+        self.status = 'queued'
+        self.next_due = None
+        self.done = threading.Event()
+        self.results = {
+            'campaign_id': self.id,
+            'total_attempted': 0,
+            'successful_sends': 0,
+            'failed_sends': 0,
+            'pending_sends': 0,
+            'suppressed': 0,
+            'errors': []
+        }
+
+    def due_after(self, timestamp):
+        """Próximo horário de envio respeitando o horário de silêncio"""
+        moment = next_allowed_time(datetime.fromtimestamp(timestamp), self.quiet_start, self.quiet_end)
+        return moment.timestamp()
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.results
+
+class CampaignDispatcher:
+    def __init__(self, sender_factory, close_sender_when_idle=True):
+        self.sender_factory = sender_factory
+        self.close_sender_when_idle = close_sender_when_idle
+        self.sender = None
+        self.heap = []
+        self.campaigns = {}
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+        self.thread = None
+        self.stopping = False
+
+    def submit(self, campaign, start_at=None):
+        """Enfileira a campanha; o primeiro envio ocorre em start_at (ou agora)"""
+        first_due = campaign.due_after(start_at.timestamp() if start_at else time.time())
+
+        with self.condition:
+            self.campaigns[campaign.id] = campaign
+            self._schedule(campaign, first_due)
+            if not self.thread or not self.thread.is_alive():
+                self.stopping = False
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+        logger.info(f"Campanha {campaign.id} na fila: {len(campaign.pending)} alvos")
+        return campaign
+
+    def cancel(self, campaign_id):
+        with self.condition:
+            campaign = self.campaigns.pop(campaign_id, None)
+        if campaign:
+            campaign.results['success'] = False
+            campaign.results['error'] = 'Campanha cancelada'
+            self._finish(campaign, 'cancelled')
+        return campaign is not None
+
+    def active_campaigns(self):
+        with self.condition:
+            return [
+                {
+                    'id': campaign.id,
+                    'status': campaign.status,
+                    'pending': len(campaign.pending),
+                    'next_due': datetime.fromtimestamp(campaign.next_due).isoformat() if campaign.next_due else None,
+                    'successful_sends': campaign.results['successful_sends']
+                }
+                for campaign in self.campaigns.values()
+            ]
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _schedule(self, campaign, due):
+        campaign.next_due = due
+        heapq.heappush(self.heap, (due, next(self.counter), campaign.id))
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap and not self.stopping:
+                    self._release_sender_if_idle()
+                    self.condition.wait()
+                if self.stopping:
+                    break
+
+                due, _, campaign_id = self.heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    # Acordar no vencimento ou quando uma campanha nova entrar
+                    self.condition.wait(delay)
+                    continue
+
+                heapq.heappop(self.heap)
+                campaign = self.campaigns.get(campaign_id)
+
+            if campaign is None:
+                continue
+
+            with log_context(campaign_id=campaign.id):
+                self._fire(campaign)
+
+            with self.condition:
+                if campaign.id not in self.campaigns:
+                    # Cancelada durante o envio
+                    continue
+                finished = (not campaign.pending and not campaign.outstanding) or campaign.status == 'failed'
+                if finished:
+                    del self.campaigns[campaign.id]
+                elif campaign.pending:
+                    self._schedule(campaign, campaign.due_after(time.time() + campaign.interval))
+                else:
+                    # Só falta confirmar envios enfileirados
+                    self._schedule(campaign, time.time() + SETTLE_INTERVAL)
+
+            if finished:
+                campaign.results.setdefault('success', True)
+                with log_context(campaign_id=campaign.id):
+                    self._finish(campaign, 'failed' if campaign.status == 'failed' else 'done')
+
+        self._release_sender_if_idle()
+
+    def _fire(self, campaign):
+        """Envia para o próximo alvo elegível da campanha"""
+        campaign.status = 'running'
+
+        if not self._ensure_sender():
+            campaign.status = 'failed'
+            campaign.results['success'] = False
+            campaign.results['error'] = 'Falha no login do WhatsApp'
+            return
+
+        db = SessionLocal()
+        try:
+            if campaign.outstanding:
+                self._settle(db, campaign)
+
+            if campaign.suppressed_phones is None:
+                campaign.suppressed_phones = load_suppressed_phones(db)
+
+            # Alvos pulados (já contatados, suprimidos) não consomem o intervalo
+            while campaign.pending:
+                business = db.get(Business, campaign.pending.popleft())
+                if business and self.sender.deliver(
+                    db, business, campaign.suppressed_phones, campaign.results,
+                    test_mode=campaign.test_mode, pending_jobs=campaign.outstanding
+                ):
+                    break
+
+        except Exception as e:
+            logger.error(f"Erro na campanha {campaign.id}: {str(e)}")
+            campaign.results['errors'].append(str(e))
+        finally:
+            db.close()
+
+    def _settle(self, db, campaign):
+        """Grava o resultado dos envios que terminaram na fila do serviço
+
+        Um envio sem resultado depois de WHATSAPP_SEND_TIMEOUT deixa de ser
+        conferido pela campanha, mas o log continua pendente: o negócio fica
+        fora das próximas campanhas, porque a mensagem ainda pode ter saído.
+        """
+        still_open = set(self.sender.settle_jobs(db, list(campaign.outstanding), campaign.results))
+        expired_before = time.time() - get_config().WHATSAPP_SEND_TIMEOUT
+        for job_id, queued_at in list(campaign.outstanding.items()):
+            if job_id not in still_open:
+                del campaign.outstanding[job_id]
+            elif queued_at < expired_before:
+                logger.warning(f"Envio {job_id} sem confirmação do serviço; negócio fica fora das próximas campanhas")
+                del campaign.outstanding[job_id]
+
+    def _ensure_sender(self):
+        if self.sender is not None:
+            return True
+        try:
+            self.sender = self.sender_factory()
+            if self.sender.login_whatsapp():
+                return True
+        except Exception as e:
+            logger.error(f"Erro ao iniciar sessão do WhatsApp: {str(e)}")
+        self._close_sender()
+        return False
+
+    def _release_sender_if_idle(self):
+        if self.sender is not None and self.close_sender_when_idle and not self.campaigns:
+            self._close_sender()
+
+    def _close_sender(self):
+        if self.sender is not None:
+            try:
+                self.sender.close()
+            except Exception:
+                pass
+        self.sender = None
+
+    def _finish(self, campaign, status):
+        campaign.status = status
+        campaign.next_due = None
+        campaign.done.set()
+        logger.info(f"Campanha {campaign.id} finalizada ({status}): "
+                    f"{campaign.results['successful_sends']} mensagens enviadas")
+        if campaign.on_complete:
+            try:
+                campaign.on_complete(campaign.results)
+            except Exception as e:
+                logger.error(f"Erro no callback da campanha {campaign.id}: {str(e)}")
+
+def _create_default_sender():
+    # Import tardio: Selenium só é carregado quando o primeiro envio vence
+    from sender import create_sender
+    return create_sender()
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Despachante compartilhado do processo, com o sender padrão"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = CampaignDispatcher(sender_factory=_create_default_sender)
+        return _dispatcher
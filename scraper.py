@@ -1,4 +1,7 @@
 
+import base64
+import json
+import re
 import time
 import random
 from selenium import webdriver
@@ -8,24 +11,318 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import pandas as pd
-from models import Business, ScrapingSession, SessionLocal, init_db
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, WebDriverException,
+    InvalidSessionIdException, NoSuchWindowException, StaleElementReferenceException
+)
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from models import Business, ScrapingSession, PageSnapshot, SessionLocal, init_db
+from suppression import normalize_phone
+from address_parser import parse_address
+from search_planner import load_city, city_search_url, plan_tiles
+from lead_scoring import rescore_leads
+from extraction import extract_fields, parse_places_payload, place_id_from_url
+from snapshots import store_snapshot
+from config import get_config
+from log_config import setup_logging, log_context, job_context, propagate_context
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import queue
+import threading
 from datetime import datetime
 import logging
 import os
+import signal
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Lê de uma vez a URL (identificador estável) e o nome de cada card da lista
+RESULT_CARDS_SCRIPT = """
+const cards = [];
+const seen = new Set();
+document.querySelectorAll('[data-result-index] a[href*="/maps/place/"], a.hfpxzc[href*="/maps/place/"]').forEach(a => {
+    if (seen.has(a.href)) return;
+    seen.add(a.href);
+    cards.push({href: a.href, name: a.getAttribute('aria-label') || ''});
+});
+return cards;
+"""
+
+# HTML do painel de detalhes do lugar (snapshot para replay offline)
+DETAIL_PANE_SCRIPT = """
+const pane = document.querySelector('[role="main"]');
+return (pane || document.documentElement).outerHTML;
+"""
+
+# Respostas de busca com os lugares da lista (modo SCRAPER_EXTRACTION_MODE=network)
+SEARCH_PAYLOAD_RE = re.compile(r'/search\?(?:[^#]*&)?tbm=map|/maps/preview/place')
+
+# Perfil "lean" do navegador (SCRAPER_BROWSER_PROFILE=lean)
+LEAN_CHROME_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.managed_default_content_settings.geolocation': 2,
+    'profile.default_content_setting_values.notifications': 2
+}
+
+LEAN_CHROME_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+    "--mute-audio",
+    "--no-first-run",
+    "--disk-cache-size=33554432",
+    "--media-cache-size=1",
+    "--renderer-process-limit=2"
+]
+
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*fonts.gstatic.com*", "*fonts.googleapis.com*",
+    "*/maps/vt?*", "*/maps/vt/*", "*/kh/v=*", "*khms*.google.com*",
+    "*streetviewpixels*", "*googleusercontent.com*"
+]
+
+# Contadores de falha por classe, gravados no ScrapingSession
+ERROR_COUNTER_KEYS = ('timeout_errors', 'driver_errors', 'extraction_errors', 'retry_count', 'driver_restarts')
+
+# Classes de erro que valem nova tentativa
+TRANSIENT_ERRORS = ('timeout_errors', 'driver_errors')
+
+class DriverHungError(Exception):
+    """Operação passou do prazo e o navegador foi encerrado pelo watchdog"""
+
+def classify_error(error):
+    """Classe de falha de uma exceção do scraping (chave de ERROR_COUNTER_KEYS)"""
+    if isinstance(error, (DriverHungError, InvalidSessionIdException, NoSuchWindowException,
+                          Urllib3HTTPError, ConnectionError)):
+        return 'driver_errors'
+    if isinstance(error, (TimeoutException, TimeoutError)):
+        return 'timeout_errors'
+    if isinstance(error, WebDriverException) and any(
+        marker in str(error).lower() for marker in ('disconnected', 'crashed', 'not reachable', 'invalid session')
+    ):
+        return 'driver_errors'
+    return 'extraction_errors'
+
+def process_tree_pids(pid):
+    """PID do processo e de todos os seus descendentes (Linux, via /proc)"""
+    if not pid or not os.path.isdir('/proc'):
+        return []
+    
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            children.setdefault(parent, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    
+    pids = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+def process_tree_rss_mb(pid):
+    """Memória residente somada de um processo e seus descendentes (Linux, via /proc)"""
+    pids = process_tree_pids(pid)
+    if not pids:
+        return None
+    
+    total_kb = 0
+    for current in pids:
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    
+    return round(total_kb / 1024, 1)
+
+def kill_driver(driver):
+    """Encerra à força chromedriver e Chrome (quit() pode travar junto com o navegador)"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None:
+        return
+    
+    # Filhos primeiro, para o Chrome não ficar órfão
+    for pid in reversed(process_tree_pids(process.pid)):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+class DriverWatchdog:
+    """Encerra navegadores cuja operação passou do prazo
+    
+    Uma chamada ao chromedriver travada bloqueia a thread indefinidamente;
+    matar o processo faz a chamada falhar, e guard() converte a falha em
+    DriverHungError para o chamador substituir o navegador.
+    """
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.deadlines = {}
+        self.expired = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    @contextmanager
+    def guard(self, driver, timeout, label=''):
+        token = object()
+        with self.lock:
+            self.deadlines[token] = (driver, time.monotonic() + timeout, label)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            yield
+        except Exception as e:
+            if token in self.expired:
+                raise DriverHungError(f"{label}: sem resposta em {timeout}s") from e
+            raise
+        else:
+            if token in self.expired:
+                raise DriverHungError(f"{label}: sem resposta em {timeout}s")
+        finally:
+            with self.lock:
+                self.deadlines.pop(token, None)
+                self.expired.discard(token)
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            now = time.monotonic()
+            with self.lock:
+                overdue = [
+                    (token, driver, label) for token, (driver, deadline, label) in self.deadlines.items()
+                    if deadline < now and token not in self.expired
+                ]
+                self.expired.update(token for token, _, _ in overdue)
+            
+            for _, driver, label in overdue:
+                logger.warning(f"Watchdog: navegador travado em '{label}', encerrando")
+                kill_driver(driver)
+    
+    def stop(self):
+        self.stop_event.set()
+
+class SeleniumPage:
+    """Página aberta no navegador, com a interface usada por extraction.extract_fields"""
+    def __init__(self, driver):
+        self.driver = driver
+    
+    def first_text(self, selector):
+        try:
+            return self.driver.find_element(By.CSS_SELECTOR, selector).text
+        except (NoSuchElementException, StaleElementReferenceException):
+            return None
+    
+    def first_attr(self, selector, attr):
+        try:
+            return self.driver.find_element(By.CSS_SELECTOR, selector).get_attribute(attr)
+        except (NoSuchElementException, StaleElementReferenceException):
+            return None
+    
+    def all_attrs(self, selector, attr):
+        try:
+            return [element.get_attribute(attr) for element in self.driver.find_elements(By.CSS_SELECTOR, selector)]
+        except StaleElementReferenceException:
+            return []
+
+class NetworkPayloadCollector:
+    """Lê dos logs de performance do Chrome as respostas da busca do Maps
+    
+    Cada chamada de collect() consome o log acumulado desde a anterior, pega
+    o corpo das respostas de busca já concluídas (Network.getResponseBody) e
+    retorna os lugares encontrados nelas, por id do lugar.
+    """
+    def __init__(self, driver, on_error=None):
+        self.driver = driver
+        self.on_error = on_error
+        self.pending = {}
+    
+    def collect(self):
+        places = {}
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (ValueError, KeyError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            
+            if method == 'Network.responseReceived':
+                if SEARCH_PAYLOAD_RE.search(params.get('response', {}).get('url', '')):
+                    self.pending[params['requestId']] = params['response']['url']
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self.pending:
+                url = self.pending.pop(params['requestId'])
+                places.update(self.read_places(params['requestId'], url))
+        return places
+    
+    def read_places(self, request_id, url):
+        try:
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            body = response.get('body', '')
+            if response.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            places = parse_places_payload(body)
+        except Exception as e:
+            # Navegador travado/morto sobe; payload ilegível cai no DOM
+            if classify_error(e) in TRANSIENT_ERRORS:
+                raise
+            if self.on_error:
+                self.on_error()
+            logger.warning(f"Payload da busca ilegível ({url[:80]}): {str(e)}")
+            return {}
+        
+        return places
+
 class GoogleMapsScraper:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, browser_profile=None, capture=None, extraction_mode=None):
         self.headless = headless
+        self.browser_profile = browser_profile or get_config().SCRAPER_BROWSER_PROFILE
+        self.capture = get_config().SCRAPER_CAPTURE if capture is None else capture
+        self.extraction_mode = extraction_mode or get_config().SCRAPER_EXTRACTION_MODE
+        self.snapshots = []
+        self.metrics = {
+            'profile': self.browser_profile,
+            'page_loads': 0,
+            'page_load_ms_total': 0.0,
+            'peak_rss_mb': None,
+            'peak_rss_per_browser_mb': None,
+            'payload_places': 0,
+            'payload_errors': 0,
+            'dom_fallbacks': 0
+        }
         self.driver = None
+        self.last_discovered_count = 0
+        self.extraction_drivers = []
+        self.metrics_lock = threading.Lock()
+        self.error_counts = dict.fromkeys(ERROR_COUNTER_KEYS, 0)
+        self.watchdog = DriverWatchdog()
         self.setup_driver()
         
-    def setup_driver(self):
+    def create_driver(self, network_log=False):
         chrome_options = Options()
         if self.headless:
             chrome_options.add_argument("--headless")
@@ -35,172 +332,506 @@ class GoogleMapsScraper:
         chrome_options.add_argument("--window-size=1920,1080")
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
         
+        lean = self.browser_profile == 'lean'
+        if lean:
+            # Não extraímos imagens, fontes, mídia nem tiles do mapa
+            chrome_options.add_experimental_option('prefs', LEAN_CHROME_PREFS)
+            for argument in LEAN_CHROME_ARGS:
+                chrome_options.add_argument(argument)
+        
+        if network_log:
+            # Eventos de rede no log de performance (respostas da busca)
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        
         service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
         
-    def search_businesses(self, keyword, max_results=50):
-        """Busca negócios no Google Maps"""
-        search_query = f"{keyword} Curitiba"
-        url = f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
+        # Um único Network.enable: uma segunda chamada substituiria os parâmetros da primeira
+        if network_log or lean:
+            network_params = {}
+            if network_log:
+                # Buffers maiores para o corpo das respostas continuar disponível até ser lido
+                network_params = {
+                    'maxTotalBufferSize': 64 * 1024 * 1024,
+                    'maxResourceBufferSize': 16 * 1024 * 1024
+                }
+            driver.execute_cdp_cmd('Network.enable', network_params)
         
-        logger.info(f"Buscando: {search_query}")
-        self.driver.get(url)
+        if lean:
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
         
-        # Aguardar carregamento
-        time.sleep(5)
+        # Prazos do próprio navegador; o watchdog cobre o chromedriver travado
+        config = get_config()
+        driver.set_page_load_timeout(config.SCRAPER_PAGE_LOAD_TIMEOUT)
+        driver.set_script_timeout(config.SCRAPER_SCRIPT_TIMEOUT)
+        
+        return driver
+        
+    def setup_driver(self):
+        self.driver = self.create_driver(network_log=self.extraction_mode == 'network')
+        
+    def replace_driver(self, driver):
+        """Encerra um navegador travado/morto e coloca um novo no lugar dele"""
+        kill_driver(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        
+        new_driver = self.create_driver(network_log=driver is self.driver and self.extraction_mode == 'network')
+        with self.metrics_lock:
+            if driver is self.driver:
+                self.driver = new_driver
+            elif driver in self.extraction_drivers:
+                self.extraction_drivers[self.extraction_drivers.index(driver)] = new_driver
+            self.error_counts['driver_restarts'] += 1
+        
+        logger.info("Navegador substituído")
+        return new_driver
+        
+    def count_metric(self, key, amount=1):
+        with self.metrics_lock:
+            self.metrics[key] += amount
+        
+    def record_error(self, error):
+        """Conta a falha na sua classe e retorna a classe"""
+        error_class = classify_error(error)
+        with self.metrics_lock:
+            self.error_counts[error_class] += 1
+        return error_class
+        
+    def backoff(self, attempt):
+        """Espera exponencial com jitter antes da próxima tentativa"""
+        with self.metrics_lock:
+            self.error_counts['retry_count'] += 1
+        time.sleep(get_config().SCRAPER_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.75, 1.25))
+        
+    def take_error_counts(self):
+        """Retorna e zera os contadores de falha (um ScrapingSession por keyword)"""
+        with self.metrics_lock:
+            counts = self.error_counts
+            self.error_counts = dict.fromkeys(ERROR_COUNTER_KEYS, 0)
+        return counts
+        
+    def get_extraction_drivers(self, count):
+        """Navegadores que abrem os detalhes enquanto o principal continua o scroll"""
+        while len(self.extraction_drivers) < count:
+            self.extraction_drivers.append(self.create_driver())
+        return self.extraction_drivers[:count]
+        
+    def search_businesses(self, keyword, max_results=50, tile=None, city=None):
+        """Busca negócios no Google Maps (cidade inteira ou um tile)
+        
+        Pipeline em streaming: o navegador principal rola a lista e publica a
+        URL de cada lugar assim que aparece; navegadores de extração abrem os
+        detalhes em paralelo. O scroll para quando max_results lugares únicos
+        foram extraídos.
+        
+        No modo 'network', lugares que vieram no payload da busca são aceitos
+        direto, sem abrir a página; só os demais vão para os navegadores de
+        extração (criados na primeira vez que forem necessários).
+        """
+        config = get_config()
+        city = city or load_city()
+        if tile:
+            url = tile.search_url(keyword, city)
+            logger.info(f"Buscando: {keyword} [{tile.label}]")
+        else:
+            url = city_search_url(keyword, city)
+            logger.info(f"Buscando: {keyword} {city['name']}")
+        
+        self.last_discovered_count = 0
         
         businesses = []
         processed_names = set()
+        state = {'in_flight': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+        workers = max(1, get_config().SCRAPER_EXTRACT_WORKERS)
+        cards = queue.Queue(maxsize=workers * 4)
+        
+        def accept(business_data):
+            with lock:
+                if business_data and business_data['name'] not in processed_names:
+                    business_data['scraped_keyword'] = keyword
+                    businesses.append(business_data)
+                    processed_names.add(business_data['name'])
+                    logger.info(f"Extraído: {business_data['name']}")
+                    if len(businesses) >= max_results:
+                        stop.set()
+        
+        def consume(slot):
+            while True:
+                card = cards.get()
+                if card is None:
+                    break
+                try:
+                    if stop.is_set():
+                        continue
+                    accept(self.extract_with_retry(slot, card['href'], stop))
+                except Exception as e:
+                    logger.error(f"Erro ao processar resultado {card['href']}: {str(e)}")
+                finally:
+                    with lock:
+                        state['in_flight'] -= 1
+        
+        def can_scroll():
+            # Só carregar mais cards se os já descobertos não bastarem
+            with lock:
+                return len(businesses) + state['in_flight'] < max_results
+        
+        network_mode = self.extraction_mode == 'network'
+        if not network_mode:
+            self.get_extraction_drivers(workers)
+        consumers = [
+            threading.Thread(target=propagate_context(consume), args=(slot,), daemon=True)
+            for slot in range(workers)
+        ]
+        for consumer in consumers:
+            consumer.start()
+        
+        # Cards já publicados; após reabrir a lista, a descoberta continua de onde parou
+        seen = set()
+        attempt = 0
         
         try:
-            # Scroll para carregar mais resultados
-            self.scroll_results(max_results)
-            
-            # Encontrar todos os resultados
-            results = self.driver.find_elements(By.CSS_SELECTOR, '[data-result-index]')
-            logger.info(f"Encontrados {len(results)} resultados iniciais")
-            
-            for i, result in enumerate(results[:max_results]):
+            while not stop.is_set():
                 try:
-                    # Clicar no resultado para abrir detalhes
-                    self.driver.execute_script("arguments[0].click();", result)
-                    time.sleep(random.uniform(2, 4))
-                    
-                    business_data = self.extract_business_data()
+                    with self.watchdog.guard(self.driver, config.SCRAPER_RESULT_TIMEOUT, 'abrir lista'):
+                        self.load_page(self.driver, url)
                     
-                    if business_data and business_data['name'] not in processed_names:
-                        business_data['scraped_keyword'] = keyword
-                        businesses.append(business_data)
-                        processed_names.add(business_data['name'])
-                        logger.info(f"Extraído: {business_data['name']}")
+                    # Aguardar carregamento
+                    time.sleep(5)
                     
-                    # Pequena pausa entre extrações
-                    time.sleep(random.uniform(1, 2))
+                    for card in self.iter_result_cards(stop, can_scroll, seen):
+                        if card.get('payload'):
+                            accept(card['payload'])
+                            continue
+                        
+                        if network_mode:
+                            # Sem o lugar no payload: abrir a página (caminho do DOM)
+                            self.get_extraction_drivers(workers)
+                            self.count_metric('dom_fallbacks')
+                        
+                        with lock:
+                            state['in_flight'] += 1
+                        while not stop.is_set():
+                            try:
+                                cards.put(card, timeout=1)
+                                break
+                            except queue.Full:
+                                continue
+                        else:
+                            with lock:
+                                state['in_flight'] -= 1
+                            break
+                    break
                     
                 except Exception as e:
-                    logger.error(f"Erro ao processar resultado {i}: {str(e)}")
-                    continue
+                    error_class = self.record_error(e)
+                    if error_class not in TRANSIENT_ERRORS or attempt >= config.SCRAPER_MAX_RETRIES:
+                        logger.error(f"Erro durante scraping: {str(e)}")
+                        break
                     
-        except Exception as e:
-            logger.error(f"Erro durante scraping: {str(e)}")
+                    logger.warning(f"Falha na lista de resultados ({error_class}), tentando novamente: {str(e)}")
+                    if error_class == 'driver_errors':
+                        try:
+                            self.replace_driver(self.driver)
+                        except Exception as restart_error:
+                            logger.error(f"Não foi possível substituir o navegador: {str(restart_error)}")
+                            break
+                    self.backoff(attempt)
+                    attempt += 1
             
-        return businesses
-    
-    def scroll_results(self, max_results):
-        """Scroll na lista de resultados para carregar mais"""
-        try:
-            results_panel = self.driver.find_element(By.CSS_SELECTOR, '[role="main"]')
+            logger.info(f"Encontrados {self.last_discovered_count} resultados")
+            self.sample_memory()
+        finally:
+            for _ in consumers:
+                cards.put(None)
+            for consumer in consumers:
+                consumer.join()
             
+        return businesses[:max_results]
+    
+    def iter_result_cards(self, stop, can_scroll=None, seen=None):
+        """Gera os cards da lista conforme aparecem no scroll, identificados pela URL do lugar
+        
+        As URLs são lidas em uma única chamada de script, então re-renderizações
+        da lista não invalidam referências nem fazem resultados sumirem. Cards
+        em `seen` (de uma tentativa anterior) não são gerados de novo.
+        
+        No modo 'network', card['payload'] traz os dados do lugar quando ele
+        veio nas respostas da busca já recebidas.
+        """
+        seen = set() if seen is None else seen
+        idle_scrolls = 0
+        timeout = get_config().SCRAPER_SCRIPT_TIMEOUT * 2
+        collector = None
+        if self.extraction_mode == 'network':
+            collector = NetworkPayloadCollector(self.driver, on_error=lambda: self.count_metric('payload_errors'))
+        payload_places = {}
+        
+        with self.watchdog.guard(self.driver, timeout, 'localizar lista'):
+            results_panel = self.driver.find_elements(By.CSS_SELECTOR, '[role="feed"]')
+            results_panel = results_panel[0] if results_panel else self.driver.find_element(By.CSS_SELECTOR, '[role="main"]')
             last_height = self.driver.execute_script("return arguments[0].scrollHeight", results_panel)
-            scroll_attempts = 0
-            max_scrolls = max_results // 10  # Aproximadamente 10 resultados por scroll
+        
+        while not stop.is_set():
+            new_cards = 0
+            with self.watchdog.guard(self.driver, timeout, 'ler cards'):
+                if collector:
+                    payload_places.update(collector.collect())
+                found = self.driver.execute_script(RESULT_CARDS_SCRIPT) or []
+            for card in found:
+                if card['href'] in seen:
+                    continue
+                seen.add(card['href'])
+                self.last_discovered_count = len(seen)
+                new_cards += 1
+                if collector:
+                    card['payload'] = payload_places.get(place_id_from_url(card['href']))
+                    if card['payload']:
+                        self.count_metric('payload_places')
+                yield card
+                if stop.is_set():
+                    return
+            
+            # Aguardar a extração alcançar antes de carregar mais
+            while can_scroll and not can_scroll():
+                if stop.is_set():
+                    return
+                time.sleep(0.5)
             
-            while scroll_attempts < max_scrolls:
-                # Scroll down
+            # Scroll down
+            with self.watchdog.guard(self.driver, timeout, 'scroll'):
                 self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", results_panel)
-                time.sleep(3)
-                
-                # Verificar se carregou mais conteúdo
+            time.sleep(3)
+            
+            # Fim da lista: altura não muda e nenhum card novo em duas tentativas
+            with self.watchdog.guard(self.driver, timeout, 'scroll'):
                 new_height = self.driver.execute_script("return arguments[0].scrollHeight", results_panel)
-                if new_height == last_height:
+            if new_height == last_height and not new_cards:
+                idle_scrolls += 1
+                if idle_scrolls >= 2:
                     break
-                    
-                last_height = new_height
-                scroll_attempts += 1
-                
-        except Exception as e:
-            logger.error(f"Erro durante scroll: {str(e)}")
+            else:
+                idle_scrolls = 0
+            last_height = new_height
     
-    def extract_business_data(self):
-        """Extrai dados do negócio da página de detalhes"""
-        try:
-            business_data = {
-                'name': '',
-                'phone': '',
-                'address': '',
-                'category': '',
-                'rating': 0.0,
-                'reviews_count': 0,
-                'website': ''
+    def load_page(self, driver, url):
+        """driver.get cronometrado, alimentando as métricas do navegador"""
+        started = time.perf_counter()
+        driver.get(url)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        with self.metrics_lock:
+            self.metrics['page_loads'] += 1
+            self.metrics['page_load_ms_total'] += elapsed_ms
+        
+    def sample_memory(self):
+        """Atualiza o pico de memória somando todos os navegadores deste scraper"""
+        rss_values = [
+            process_tree_rss_mb(getattr(driver.service.process, 'pid', None))
+            for driver in [self.driver] + self.extraction_drivers
+            if driver and getattr(driver, 'service', None) and driver.service.process
+        ]
+        rss_values = [value for value in rss_values if value is not None]
+        if rss_values:
+            with self.metrics_lock:
+                self.metrics['peak_rss_mb'] = max(self.metrics['peak_rss_mb'] or 0, sum(rss_values))
+                self.metrics['peak_rss_per_browser_mb'] = max(
+                    self.metrics['peak_rss_per_browser_mb'] or 0,
+                    round(sum(rss_values) / len(rss_values), 1)
+                )
+        
+    def merge_metrics(self, other):
+        """Incorpora as métricas de outro scraper (navegadores extras dos tiles)"""
+        with self.metrics_lock:
+            self.metrics['page_loads'] += other.metrics['page_loads']
+            self.metrics['page_load_ms_total'] += other.metrics['page_load_ms_total']
+            for key in ('peak_rss_mb', 'peak_rss_per_browser_mb'):
+                if other.metrics[key] is not None:
+                    self.metrics[key] = max(self.metrics[key] or 0, other.metrics[key])
+            for key in ('payload_places', 'payload_errors', 'dom_fallbacks'):
+                self.metrics[key] += other.metrics[key]
+            for key, value in other.take_error_counts().items():
+                self.error_counts[key] += value
+            self.snapshots.extend(other.take_snapshots())
+        
+    def get_metrics(self):
+        with self.metrics_lock:
+            loads = self.metrics['page_loads']
+            return {
+                'profile': self.metrics['profile'],
+                'page_loads': loads,
+                'avg_page_load_ms': round(self.metrics['page_load_ms_total'] / loads, 1) if loads else None,
+                'peak_rss_mb': self.metrics['peak_rss_mb'],
+                'peak_rss_per_browser_mb': self.metrics['peak_rss_per_browser_mb'],
+                'extraction_mode': self.extraction_mode,
+                'payload_places': self.metrics['payload_places'],
+                'payload_errors': self.metrics['payload_errors'],
+                'dom_fallbacks': self.metrics['dom_fallbacks']
             }
-            
-            # Nome do negócio
-            try:
-                name_element = self.driver.find_element(By.CSS_SELECTOR, 'h1[data-attrid="title"]')
-                business_data['name'] = name_element.text.strip()
-            except:
-                try:
-                    name_element = self.driver.find_element(By.CSS_SELECTOR, '[data-section-id="oh"] h1')
-                    business_data['name'] = name_element.text.strip()
-                except:
-                    pass
-            
-            # Telefone
-            try:
-                phone_elements = self.driver.find_elements(By.CSS_SELECTOR, '[data-item-id*="phone"]')
-                for element in phone_elements:
-                    phone_text = element.get_attribute('data-item-id')
-                    if 'phone:tel:' in phone_text:
-                        business_data['phone'] = phone_text.replace('phone:tel:', '')
-                        break
-            except:
-                pass
-            
-            # Endereço
-            try:
-                address_element = self.driver.find_element(By.CSS_SELECTOR, '[data-item-id="address"]')
-                business_data['address'] = address_element.text.strip()
-            except:
-                pass
-            
-            # Categoria
+        
+    def extract_with_retry(self, slot, url, stop=None):
+        """Extrai um lugar com prazo, retentativas para falhas transitórias e troca
+        do navegador do slot quando ele trava ou morre"""
+        config = get_config()
+        
+        for attempt in range(config.SCRAPER_MAX_RETRIES + 1):
+            driver = self.extraction_drivers[slot]
             try:
-                category_element = self.driver.find_element(By.CSS_SELECTOR, '[jsaction*="category"]')
-                business_data['category'] = category_element.text.strip()
-            except:
-                pass
-            
-            # Rating e reviews
+                with self.watchdog.guard(driver, config.SCRAPER_RESULT_TIMEOUT, url):
+                    return self.extract_place(driver, url)
+            except Exception as e:
+                error_class = self.record_error(e)
+                if error_class not in TRANSIENT_ERRORS or attempt >= config.SCRAPER_MAX_RETRIES or (stop and stop.is_set()):
+                    logger.error(f"Erro ao processar resultado {url} ({error_class}): {str(e)}")
+                    return None
+                
+                logger.warning(f"Falha transitória em {url} ({error_class}), tentativa {attempt + 1}: {str(e)}")
+                if error_class == 'driver_errors':
+                    try:
+                        self.replace_driver(driver)
+                    except Exception as restart_error:
+                        logger.error(f"Não foi possível substituir o navegador: {str(restart_error)}")
+                        return None
+                self.backoff(attempt)
+        
+        return None
+    
+    def extract_place(self, driver, url):
+        """Abre a página do lugar em um navegador de extração e extrai os dados"""
+        self.load_page(driver, url)
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'h1')))
+        except TimeoutException:
+            pass
+        time.sleep(random.uniform(1, 2))
+        business_data = self.extract_business_data(driver)
+        if self.capture:
+            self.capture_snapshot(driver, url, business_data)
+        return business_data
+    
+    def capture_snapshot(self, driver, url, business_data):
+        """Guarda o HTML do painel, inclusive quando a extração falhou (DOM mudou)"""
+        try:
+            snapshot = store_snapshot(driver.execute_script(DETAIL_PANE_SCRIPT) or '')
+        except Exception as e:
+            if classify_error(e) in TRANSIENT_ERRORS:
+                raise
+            logger.warning(f"Falha ao capturar snapshot de {url}: {str(e)}")
+            return
+        
+        snapshot['url'] = url
+        snapshot['key'] = (business_data['name'], business_data['phone']) if business_data else None
+        with self.metrics_lock:
+            self.snapshots.append(snapshot)
+    
+    def take_snapshots(self):
+        """Retorna e zera os snapshots capturados desde a última chamada"""
+        with self.metrics_lock:
+            snapshots, self.snapshots = self.snapshots, []
+        return snapshots
+    
+    def search_tiled(self, keyword, max_results, city=None, mode='grid', workers=1):
+        """Busca por tiles em paralelo, subdividindo tiles que atingem o limite do Maps"""
+        config = get_config()
+        city = city or load_city()
+        tile_cap = config.SEARCH_TILE_RESULT_CAP
+        tiles = deque(plan_tiles(city, mode=mode, grid_size=config.SEARCH_GRID_SIZE))
+        
+        # Cada navegador atende um tile por vez; extras são criados sob demanda
+        idle_scrapers = queue.Queue()
+        idle_scrapers.put(self)
+        extra_scrapers = []
+        
+        def search_tile(tile):
             try:
-                rating_element = self.driver.find_element(By.CSS_SELECTOR, '[jsaction*="pane.rating"]')
-                rating_text = rating_element.text
-                if rating_text:
-                    parts = rating_text.split()
-                    if len(parts) >= 1:
-                        business_data['rating'] = float(parts[0].replace(',', '.'))
-                    if len(parts) >= 2:
-                        reviews_text = parts[1].replace('(', '').replace(')', '').replace('.', '')
-                        business_data['reviews_count'] = int(reviews_text) if reviews_text.isdigit() else 0
-            except:
-                pass
-            
-            # Website
+                scraper = idle_scrapers.get_nowait()
+            except queue.Empty:
+                scraper = GoogleMapsScraper(headless=self.headless, capture=self.capture,
+                                            extraction_mode=self.extraction_mode)
+                extra_scrapers.append(scraper)
             try:
-                website_element = self.driver.find_element(By.CSS_SELECTOR, '[data-item-id*="authority"]')
-                business_data['website'] = website_element.get_attribute('href')
-            except:
-                pass
-            
-            return business_data if business_data['name'] else None
-            
+                with log_context(tile=tile.label):
+                    results = scraper.search_businesses(keyword, tile_cap, tile=tile, city=city)
+                return results, scraper.last_discovered_count
+            finally:
+                idle_scrapers.put(scraper)
+        
+        merged = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                running = {}
+                while (tiles or running) and len(merged) < max_results:
+                    while tiles and len(running) < workers:
+                        tile = tiles.popleft()
+                        running[executor.submit(propagate_context(search_tile), tile)] = tile
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        tile = running.pop(future)
+                        try:
+                            results, discovered = future.result()
+                        except Exception as e:
+                            logger.error(f"Erro no tile {tile.label}: {str(e)}")
+                            continue
+                        
+                        for business_data in results:
+                            merged.setdefault((business_data['name'], business_data['phone']), business_data)
+                        
+                        # Tile saturado: a lista foi cortada pelo Maps, dividir em quadrantes
+                        if discovered >= tile_cap and tile.depth < config.SEARCH_MAX_TILE_DEPTH:
+                            subtiles = tile.subdivide()
+                            if subtiles:
+                                logger.info(f"Tile {tile.label} atingiu {discovered} resultados, subdividindo")
+                                tiles.extend(subtiles)
+                
+                # Não iniciar novos tiles; aguardar os que já estão rodando
+                for future in running:
+                    try:
+                        results, _ = future.result()
+                        for business_data in results:
+                            merged.setdefault((business_data['name'], business_data['phone']), business_data)
+                    except Exception as e:
+                        logger.error(f"Erro no tile {running[future].label}: {str(e)}")
+        finally:
+            for scraper in extra_scrapers:
+                self.merge_metrics(scraper)
+                scraper.close()
+        
+        logger.info(f"Busca por tiles '{keyword}': {len(merged)} negócios únicos")
+        return list(merged.values())[:max_results]
+    
+    def extract_business_data(self, driver=None):
+        """Extrai dados do negócio da página de detalhes (seletores em extraction.py)"""
+        driver = driver or self.driver
+        try:
+            return extract_fields(SeleniumPage(driver))
         except Exception as e:
+            # Navegador travado/morto sobe para extract_with_retry decidir
+            if classify_error(e) in TRANSIENT_ERRORS:
+                raise
             logger.error(f"Erro ao extrair dados: {str(e)}")
             return None
     
-    def save_to_database(self, businesses, keyword):
-        """Salva os dados no banco"""
+    def save_to_database(self, businesses, keyword, error_counts=None, snapshots=None):
+        """Salva os dados no banco (e os snapshots capturados, ligados à sessão)"""
         db = SessionLocal()
         try:
             session = ScrapingSession(
                 keyword=keyword,
                 total_found=len(businesses),
                 successful_scrapes=0,
-                started_at=datetime.now()
+                started_at=datetime.now(),
+                **(error_counts or {})
             )
             db.add(session)
             db.commit()
             
             successful = 0
+            saved = {}
             for business_data in businesses:
                 try:
                     # Verificar se já existe
@@ -210,14 +841,29 @@ class GoogleMapsScraper:
                     ).first()
                     
                     if not existing:
-                        business = Business(**business_data)
+                        business = Business(**business_data, **parse_address(business_data['address']))
+                        business.phone_normalized = normalize_phone(business.phone)
                         db.add(business)
                         successful += 1
                     
+                    saved[(business_data['name'], business_data['phone'])] = existing or business
+                    
                 except Exception as e:
                     logger.error(f"Erro ao salvar negócio: {str(e)}")
                     continue
             
+            if snapshots:
+                db.flush()
+                for snapshot in snapshots:
+                    business = saved.get(snapshot['key'])
+                    db.add(PageSnapshot(
+                        session_id=session.id,
+                        business_id=business.id if business else None,
+                        url=snapshot['url'],
+                        content_hash=snapshot['content_hash'],
+                        size_bytes=snapshot['size_bytes']
+                    ))
+            
             session.successful_scrapes = successful
             session.completed_at = datetime.now()
             session.status = 'completed'
@@ -249,14 +895,22 @@ class GoogleMapsScraper:
                     'Nome': business.name,
                     'Telefone': business.phone,
                     'Endereço': business.address,
+                    'Bairro': business.neighborhood,
+                    'CEP': business.cep,
                     'Categoria': business.category,
                     'Avaliação': business.rating,
                     'Número de Avaliações': business.reviews_count,
                     'Website': business.website,
+                    'Site Ativo': business.website_alive,
+                    'E-mail': business.email,
+                    'Instagram': business.instagram,
+                    'Facebook': business.facebook,
                     'Palavra-chave': business.scraped_keyword,
                     'Data Captura': business.created_at.strftime('%d/%m/%Y %H:%M')
                 })
             
+            import pandas as pd
+            
             df = pd.DataFrame(data)
             df.to_excel(filename, index=False)
             logger.info(f"Dados exportados para {filename}")
@@ -269,38 +923,72 @@ class GoogleMapsScraper:
             db.close()
     
     def close(self):
+        self.watchdog.stop()
+        for driver in self.extraction_drivers:
+            driver.quit()
+        self.extraction_drivers = []
         if self.driver:
             self.driver.quit()
 
-def run_scraping(keywords, max_results_per_keyword=50):
+@job_context('scraping_job')
+def run_scraping(keywords, max_results_per_keyword=50, city=None, capture=None, extraction_mode=None):
     """Função principal para executar o scraping"""
     init_db()
-    scraper = GoogleMapsScraper(headless=True)
+    config = get_config()
+    city = load_city(city)
+    
+    # 'auto' só divide em tiles quando a busca única não comporta o pedido
+    tiling = config.SEARCH_TILING
+    if tiling == 'auto':
+        tiling = 'grid' if max_results_per_keyword > config.SEARCH_TILE_RESULT_CAP else 'off'
+    
+    scraper = GoogleMapsScraper(headless=True, capture=capture, extraction_mode=extraction_mode)
     
     all_businesses = []
     
     try:
         for keyword in keywords:
-            logger.info(f"Iniciando scraping para: {keyword}")
-            businesses = scraper.search_businesses(keyword, max_results_per_keyword)
-            
-            if businesses:
-                saved_count = scraper.save_to_database(businesses, keyword)
-                all_businesses.extend(businesses)
-                logger.info(f"Concluído {keyword}: {len(businesses)} encontrados, {saved_count} salvos")
-            
-            # Pausa entre keywords
-            time.sleep(random.uniform(5, 10))
+            with log_context(keyword=keyword):
+                logger.info(f"Iniciando scraping para: {keyword}")
+                if tiling == 'off':
+                    businesses = scraper.search_businesses(keyword, max_results_per_keyword, city=city)
+                else:
+                    businesses = scraper.search_tiled(
+                        keyword, max_results_per_keyword,
+                        city=city,
+                        mode=tiling,
+                        workers=config.SCRAPER_WORKERS
+                    )
+                
+                error_counts = scraper.take_error_counts()
+                snapshots = scraper.take_snapshots()
+                if any(error_counts.values()):
+                    logger.info(f"Falhas em {keyword}: {error_counts}")
+                
+                if businesses or snapshots or any(error_counts.values()):
+                    saved_count = scraper.save_to_database(businesses, keyword, error_counts, snapshots)
+                    all_businesses.extend(businesses)
+                    logger.info(f"Concluído {keyword}: {len(businesses)} encontrados, {saved_count} salvos")
+                
+                # Pausa entre keywords
+                time.sleep(random.uniform(5, 10))
+        
+        # Atualizar prioridade dos leads com os novos negócios
+        rescore_leads()
         
         # Exportar para Excel
         excel_file = scraper.export_to_excel()
         
+        browser_metrics = scraper.get_metrics()
+        logger.info(f"Métricas do navegador: {browser_metrics}")
+        
         return {
             'total_businesses': len(all_businesses),
             'excel_file': excel_file,
+            'browser_metrics': browser_metrics,
             'success': True
         }
-        
+    
     except Exception as e:
         logger.error(f"Erro durante scraping: {str(e)}")
         return {
@@ -313,6 +1001,8 @@ def run_scraping(keywords, max_results_per_keyword=50):
         scraper.close()
 
 if __name__ == "__main__":
+    setup_logging()
+    
     # Teste com algumas categorias
     test_keywords = [
         "restaurantes",
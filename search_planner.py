@@ -0,0 +1,130 @@
+
+"""
+Planejamento de buscas por região.
+
+O Google Maps devolve no máximo ~120 lugares por lista de resultados, então
+uma busca única por "restaurantes Curitiba" cobre só uma fração da cidade.
+Aqui a cidade é dividida em tiles (grade de lat/lng ou bairros); cada tile
+vira uma busca própria e tiles que atingem o limite são subdivididos.
+"""
+import json
+import math
+import os
+from urllib.parse import quote_plus
+from config import get_config
+
+# Definições embutidas; outras cidades podem vir de CITY_DEFINITIONS_FILE
+CITIES = {
+    'Curitiba': {
+        'state': 'PR',
+        # (sul, oeste, norte, leste)
+        'bbox': (-25.645, -49.389, -25.345, -49.185),
+        'neighborhoods': [
+            'Centro', 'Batel', 'Água Verde', 'Bigorrilho', 'Mercês', 'São Francisco',
+            'Rebouças', 'Alto da XV', 'Cabral', 'Juvevê', 'Hugo Lange', 'Jardim Social',
+            'Bacacheri', 'Boa Vista', 'Ahú', 'Santa Cândida', 'Cajuru', 'Jardim Botânico',
+            'Hauer', 'Boqueirão', 'Xaxim', 'Alto Boqueirão', 'Sítio Cercado', 'Pinheirinho',
+            'Capão Raso', 'Novo Mundo', 'Portão', 'Fazendinha', 'Santa Quitéria', 'Seminário',
+            'Campo Comprido', 'Mossunguê', 'Campina do Siqueira', 'Santa Felicidade',
+            'Cidade Industrial', 'Tatuquara', 'Uberaba', 'Cristo Rei', 'Tarumã', 'Pilarzinho'
+        ]
+    }
+}
+
+# Largura aproximada da janela do navegador em pixels (ver setup_driver)
+VIEWPORT_WIDTH_PX = 1920
+
+class SearchTile:
+    """Uma região de busca: retângulo de lat/lng ou um bairro nomeado"""
+    def __init__(self, south=None, west=None, north=None, east=None, neighborhood=None, depth=0):
+        self.south = south
+        self.west = west
+        self.north = north
+        self.east = east
+        self.neighborhood = neighborhood
+        self.depth = depth
+
+    @property
+    def has_bounds(self):
+        return self.south is not None
+
+    @property
+    def center(self):
+        return ((self.south + self.north) / 2, (self.west + self.east) / 2)
+
+    @property
+    def zoom(self):
+        """Zoom do Maps em que a largura do tile ocupa a janela"""
+        span = max(self.east - self.west, 1e-6)
+        return max(10, min(18, int(math.log2(VIEWPORT_WIDTH_PX * 360 / (256 * span)))))
+
+    @property
+    def label(self):
+        if self.neighborhood:
+            return self.neighborhood
+        lat, lng = self.center
+        return f"{lat:.4f},{lng:.4f}@{self.zoom}z"
+
+    def subdivide(self):
+        """Divide o tile em 4 quadrantes; bairros não podem ser subdivididos"""
+        if not self.has_bounds:
+            return []
+        mid_lat, mid_lng = self.center
+        return [
+            SearchTile(self.south, self.west, mid_lat, mid_lng, depth=self.depth + 1),
+            SearchTile(self.south, mid_lng, mid_lat, self.east, depth=self.depth + 1),
+            SearchTile(mid_lat, self.west, self.north, mid_lng, depth=self.depth + 1),
+            SearchTile(mid_lat, mid_lng, self.north, self.east, depth=self.depth + 1)
+        ]
+
+    def search_url(self, keyword, city):
+        if self.has_bounds:
+            lat, lng = self.center
+            return f"https://www.google.com/maps/search/{quote_plus(keyword)}/@{lat:.6f},{lng:.6f},{self.zoom}z"
+        query = f"{keyword} {self.neighborhood} {city['name']}"
+        return f"https://www.google.com/maps/search/{quote_plus(query)}"
+
+    def __repr__(self):
+        return f"SearchTile({self.label}, depth={self.depth})"
+
+def load_city(name=None):
+    """Retorna a definição da cidade (embutida ou do arquivo CITY_DEFINITIONS_FILE)"""
+    config = get_config()
+    name = name or config.SEARCH_CITY
+
+    cities = dict(CITIES)
+    if config.CITY_DEFINITIONS_FILE and os.path.exists(config.CITY_DEFINITIONS_FILE):
+        with open(config.CITY_DEFINITIONS_FILE, encoding='utf-8') as f:
+            cities.update(json.load(f))
+
+    city = dict(cities.get(name, {}))
+    city['name'] = name
+    return city
+
+def city_search_url(keyword, city):
+    """Busca única pela cidade inteira (comportamento sem tiles)"""
+    query = f"{keyword} {city['name']}"
+    return f"https://www.google.com/maps/search/{query.replace(' ', '+')}"
+
+def plan_tiles(city, mode='grid', grid_size=3):
+    """Gera os tiles iniciais da cidade"""
+    if mode == 'neighborhoods' and city.get('neighborhoods'):
+        return [SearchTile(neighborhood=name) for name in city['neighborhoods']]
+
+    if not city.get('bbox'):
+        raise ValueError(f"Cidade {city['name']} sem bbox definida para busca em grade")
+
+    south, west, north, east = city['bbox']
+    lat_step = (north - south) / grid_size
+    lng_step = (east - west) / grid_size
+
+    tiles = []
+    for row in range(grid_size):
+        for col in range(grid_size):
+            tiles.append(SearchTile(
+                south + row * lat_step,
+                west + col * lng_step,
+                south + (row + 1) * lat_step,
+                west + (col + 1) * lng_step
+            ))
+    return tiles
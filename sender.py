@@ -10,14 +10,19 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from sqlalchemy import or_
 from models import Business, MessageLog, SessionLocal, init_db
+from campaign import MESSAGE_TEMPLATE, personalize_message, messaging_targets_query, prepare_targets
+from dry_run import simulate_campaign
+from scheduler import Campaign, CampaignDispatcher, get_dispatcher
+from config import get_config
+from log_config import setup_logging
+from suppression import normalize_phone
 from datetime import datetime
 import logging
 import os
 import urllib.parse
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class WhatsAppSender:
@@ -25,23 +30,7 @@ class WhatsAppSender:
         self.headless = headless
         self.driver = None
         self.setup_driver()
-        self.message_template = """Olá {nome},
-
-Seu negócio em Curitiba merece mais do que apenas ser encontrado. Ele merece ser descoberto por clientes prontos para comprar, que buscam ativamente o que você oferece, bem aqui na sua região.
-
-Você já usa o Google Meu Negócio? Ótimo! Ele ajuda a ser visto. Mas e se eu te disser que existe uma forma de ir além, de alcançar um público que já está buscando soluções locais e específicas, com um suporte personalizado que o Google não oferece?
-
-No Propagou Negócios, nós não apenas listamos sua empresa; nós a promovemos ativamente para um público engajado em Curitiba e região. Nos últimos 90 dias, tivemos mais de 3.900 visitantes únicos e 4.100 pageviews, com um crescimento de mais de 23%!
-
-Isso significa que seu anúncio estará em um ambiente onde as pessoas já estão com a intenção de compra, buscando guias de empregos, informações sobre bairros e listas de serviços – ou seja, clientes qualificados esperando para te encontrar.
-
-Quer saber como podemos levar seu negócio para o próximo nível e transformar essa visibilidade em vendas reais? É rápido e sem compromisso.
-
-Responda a esta mensagem ou clique no link para conversarmos:
-https://wa.me/5541995343245
-
-Atenciosamente,
-Equipe Propagou Negócios"""
+        self.message_template = MESSAGE_TEMPLATE
         
     def setup_driver(self):
         chrome_options = Options()
@@ -93,15 +82,22 @@ Equipe Propagou Negócios"""
             logger.error(f"Erro ao fazer login: {str(e)}")
             return False
     
+    def is_logged_in(self):
+        """Verifica, sem aguardar, se a sessão do WhatsApp Web está ativa"""
+        if not self.driver.current_url.startswith("https://web.whatsapp.com"):
+            return False
+        if self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="qr-code"]'):
+            return False
+        return bool(
+            self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="chat-list"]') or
+            self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="compose-box-input"]')
+        )
+    
     def send_message_to_number(self, phone, message):
         """Envia mensagem para um número específico"""
         try:
-            # Limpar número (remover caracteres especiais)
-            clean_phone = ''.join(filter(str.isdigit, phone))
-            
-            # Adicionar código do país se não tiver
-            if not clean_phone.startswith('55'):
-                clean_phone = '55' + clean_phone
+            # Limpar número e adicionar código do país se não tiver
+            clean_phone = normalize_phone(phone)
             
             # URL do WhatsApp com número
             url = f"https://web.whatsapp.com/send?phone={clean_phone}"
@@ -146,102 +142,134 @@ Equipe Propagou Negócios"""
             logger.error(f"Erro ao enviar mensagem para {phone}: {str(e)}")
             return False
     
-    def send_bulk_messages(self, businesses, messages_per_hour=10, test_mode=False):
-        """Envia mensagens em lote com controle de velocidade"""
-        if not self.login_whatsapp():
-            return {'success': False, 'error': 'Falha no login do WhatsApp'}
+    def queue_message(self, phone, message):
+        """Envia a mensagem e devolve o resultado no formato de job do serviço do WhatsApp
         
-        db = SessionLocal()
-        results = {
-            'total_attempted': 0,
-            'successful_sends': 0,
-            'failed_sends': 0,
-            'errors': []
-        }
+        Aqui o envio é síncrono e o job já vem concluído; o cliente do serviço
+        (whatsapp_service.py) só enfileira e devolve o job em aberto.
+        """
+        success = self.send_message_to_number(phone, message)
+        return {'id': None, 'status': 'done', 'success': success, 'error': None if success else 'Falha no envio'}
+    
+    def get_job(self, job_id):
+        """Estado de um envio enfileirado; None se desconhecido (sem fila no envio direto)"""
+        return None
+    
+    def settle_jobs(self, db, job_ids, results):
+        """Grava o resultado dos envios enfileirados que terminaram; retorna os ainda em aberto"""
+        still_open = []
+        for job_id in job_ids:
+            job = self.get_job(job_id)
+            if not job or job.get('status') != 'done':
+                still_open.append(job_id)
+                continue
+            
+            message_log = db.query(MessageLog).filter_by(pending_job_id=job_id).first()
+            if message_log is None:
+                continue
+            message_log.pending_job_id = None
+            results['pending_sends'] -= 1
+            self._record_result(message_log, db.get(Business, message_log.business_id), job, results)
+        
+        db.commit()
+        return still_open
+    
+    def _record_result(self, message_log, business, job, results):
+        if job.get('success'):
+            message_log.message_sent = True
+            message_log.sent_at = datetime.now()
+            message_log.error_message = None
+            results['successful_sends'] += 1
+            if business:
+                business.last_contacted_at = message_log.sent_at
+            logger.info(f"✓ Mensagem enviada para {message_log.business_name}")
+        else:
+            message_log.error_message = job.get('error') or "Falha no envio"
+            results['failed_sends'] += 1
+            results['errors'].append(f"Falha ao enviar para {message_log.business_name}")
+    
+    def deliver(self, db, business, suppressed_phones, results, test_mode=False, pending_jobs=None):
+        """Processa um negócio da campanha. Retorna True se houve tentativa de envio
         
-        # Calcular intervalo entre mensagens (em segundos)
-        interval = 3600 / messages_per_hour  # 3600 segundos = 1 hora
+        Envios que ficam na fila do serviço do WhatsApp são anotados em
+        pending_jobs (id do job -> horário) para settle_jobs conferir depois.
+        """
+        if not business.phone:
+            return False
         
-        try:
-            for business in businesses:
-                if not business.phone:
-                    continue
-                
-                results['total_attempted'] += 1
-                
-                # Verificar se já foi enviada mensagem
-                existing_log = db.query(MessageLog).filter_by(
-                    business_id=business.id,
-                    message_sent=True
-                ).first()
-                
-                if existing_log:
-                    logger.info(f"Mensagem já enviada para {business.name}")
-                    continue
-                
-                # Personalizar mensagem
-                personalized_message = self.message_template.format(
-                    nome=business.name.split()[0] if business.name else "Empresário"
-                )
-                
-                # Criar log da tentativa
-                message_log = MessageLog(
-                    business_id=business.id,
-                    business_name=business.name,
-                    phone=business.phone,
-                    message_sent=False
-                )
-                
-                if test_mode:
-                    logger.info(f"MODO TESTE - Mensagem para {business.name} ({business.phone})")
-                    message_log.message_sent = True
-                    message_log.sent_at = datetime.now()
-                    results['successful_sends'] += 1
-                else:
-                    # Enviar mensagem real
-                    success = self.send_message_to_number(business.phone, personalized_message)
-                    
-                    if success:
-                        message_log.message_sent = True
-                        message_log.sent_at = datetime.now()
-                        results['successful_sends'] += 1
-                        logger.info(f"✓ Mensagem enviada para {business.name}")
-                    else:
-                        message_log.error_message = "Falha no envio"
-                        results['failed_sends'] += 1
-                        results['errors'].append(f"Falha ao enviar para {business.name}")
-                
-                db.add(message_log)
-                db.commit()
-                
-                # Aguardar intervalo entre mensagens (exceto no modo teste)
-                if not test_mode and results['total_attempted'] < len(businesses):
-                    logger.info(f"Aguardando {interval:.1f} segundos...")
-                    time.sleep(interval)
-            
-            results['success'] = True
-            return results
+        if normalize_phone(business.phone) in suppressed_phones:
+            logger.info(f"Telefone na lista de supressão: {business.name}")
+            results['suppressed'] += 1
+            return False
+        
+        results['total_attempted'] += 1
+        
+        # Verificar se já foi enviada mensagem (ou se há envio pendente no serviço)
+        existing_log = business.last_contacted_at or db.query(MessageLog).filter(
+            MessageLog.business_id == business.id,
+            or_(MessageLog.message_sent == True, MessageLog.pending_job_id.isnot(None))
+        ).first()
+        
+        if existing_log:
+            logger.info(f"Mensagem já enviada para {business.name}")
+            return False
+        
+        # Personalizar mensagem
+        personalized_message = personalize_message(self.message_template, business.name)
+        
+        # Criar log da tentativa
+        message_log = MessageLog(
+            business_id=business.id,
+            business_name=business.name,
+            phone=business.phone,
+            message_sent=False
+        )
+        
+        if test_mode:
+            logger.info(f"MODO TESTE - Mensagem para {business.name} ({business.phone})")
+            message_log.message_sent = True
+            message_log.sent_at = datetime.now()
+            results['successful_sends'] += 1
+        else:
+            # Enviar mensagem real
+            job = self.queue_message(business.phone, personalized_message)
             
-        except Exception as e:
-            logger.error(f"Erro durante envio em lote: {str(e)}")
-            results['success'] = False
-            results['error'] = str(e)
-            return results
-        finally:
-            db.close()
+            if job['status'] == 'done':
+                self._record_result(message_log, business, job, results)
+            else:
+                # Na fila do serviço: o log pendente tira o negócio das próximas
+                # campanhas; last_contacted_at só quando o envio for confirmado
+                message_log.pending_job_id = job['id']
+                results['pending_sends'] += 1
+                if pending_jobs is not None:
+                    pending_jobs[job['id']] = time.time()
+        
+        if message_log.message_sent:
+            business.last_contacted_at = message_log.sent_at
+        
+        db.add(message_log)
+        db.commit()
+        return True
     
-    def get_businesses_for_messaging(self, limit=None, category_filter=None):
+    def send_bulk_messages(self, businesses, messages_per_hour=10, test_mode=False, quiet_hours=(None, None)):
+        """Envia mensagens em lote com controle de velocidade (bloqueia até o fim)"""
+        dispatcher = CampaignDispatcher(sender_factory=lambda: self, close_sender_when_idle=False)
+        campaign = dispatcher.submit(Campaign(
+            [business.id for business in businesses],
+            messages_per_hour=messages_per_hour,
+            quiet_hours=quiet_hours,
+            test_mode=test_mode
+        ))
+        
+        results = campaign.wait()
+        dispatcher.stop()
+        return results
+    
+    def get_businesses_for_messaging(self, limit=None, category_filter=None, location_filter=None):
         """Busca negócios para envio de mensagens"""
         db = SessionLocal()
         try:
-            query = db.query(Business).filter(Business.phone.isnot(None), Business.phone != '')
-            
-            if category_filter:
-                query = query.filter(Business.category.contains(category_filter))
-            
-            # Excluir negócios que já receberam mensagem
-            sent_business_ids = db.query(MessageLog.business_id).filter(MessageLog.message_sent == True).subquery()
-            query = query.filter(~Business.id.in_(sent_business_ids))
+            query = messaging_targets_query(db, category_filter=category_filter, location_filter=location_filter)
             
             if limit:
                 query = query.limit(limit)
@@ -254,46 +282,78 @@ Equipe Propagou Negócios"""
     def close(self):
         if self.driver:
             self.driver.quit()
+            self.driver = None
+
+def create_sender():
+    """Usa o serviço de sessão persistente se configurado, senão abre um Chrome local"""
+    service_url = get_config().WHATSAPP_SERVICE_URL
+    if service_url:
+        from whatsapp_service import ServiceWhatsAppSender
+        return ServiceWhatsAppSender(service_url)
+    return WhatsAppSender(headless=False)  # Não usar headless para WhatsApp
 
-def run_message_campaign(max_messages=50, messages_per_hour=10, category_filter=None, test_mode=False):
-    """Executa campanha de mensagens"""
+def run_message_campaign(max_messages=50, messages_per_hour=10, category_filter=None, test_mode=False,
+                         quiet_hours=None, wait=True, on_complete=None, location_filter=None):
+    """Executa campanha de mensagens pelo despachante compartilhado"""
     init_db()
-    sender = WhatsAppSender(headless=False)  # Não usar headless para WhatsApp
     
-    try:
-        # Buscar negócios para envio
-        businesses = sender.get_businesses_for_messaging(
-            limit=max_messages,
-            category_filter=category_filter
-        )
-        
-        if not businesses:
-            return {
-                'success': False,
-                'error': 'Nenhum negócio encontrado para envio de mensagens'
-            }
-        
-        logger.info(f"Iniciando campanha para {len(businesses)} negócios")
-        
-        # Executar envio
-        results = sender.send_bulk_messages(
-            businesses=businesses,
+    if test_mode:
+        # Modo teste é uma simulação: não abre navegador nem grava envios
+        result = simulate_campaign(
+            max_messages=max_messages,
             messages_per_hour=messages_per_hour,
-            test_mode=test_mode
+            category_filter=category_filter,
+            location_filter=location_filter,
+            quiet_hours=quiet_hours
         )
-        
-        return results
-        
-    except Exception as e:
-        logger.error(f"Erro na campanha: {str(e)}")
+        if on_complete:
+            on_complete(result)
+        return result
+    
+    if quiet_hours is None:
+        config = get_config()
+        quiet_hours = (config.QUIET_HOURS_START, config.QUIET_HOURS_END)
+    
+    prepare_targets(location_filter)
+    db = SessionLocal()
+    try:
+        # Buscar negócios para envio (apenas ids: o envio recarrega cada um na hora)
+        query = messaging_targets_query(db, Business.id, category_filter=category_filter,
+                                        location_filter=location_filter)
+        if max_messages:
+            query = query.limit(max_messages)
+        business_ids = [row.id for row in query]
+    finally:
+        db.close()
+    
+    if not business_ids:
         return {
             'success': False,
-            'error': str(e)
+            'error': 'Nenhum negócio encontrado para envio de mensagens'
         }
-    finally:
-        sender.close()
+    
+    logger.info(f"Iniciando campanha para {len(business_ids)} negócios")
+    
+    campaign = get_dispatcher().submit(Campaign(
+        business_ids,
+        messages_per_hour=messages_per_hour,
+        quiet_hours=quiet_hours,
+        on_complete=on_complete
+    ))
+    
+    if wait:
+        return campaign.wait()
+    
+    return {
+        'success': True,
+        'queued': True,
+        'campaign_id': campaign.id,
+        'total_targets': len(business_ids)
+    }
 
 if __name__ == "__main__":
+    setup_logging()
+    
     # Teste da campanha
     result = run_message_campaign(
         max_messages=5,
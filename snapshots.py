@@ -0,0 +1,165 @@
+
+"""
+Captura e replay de páginas de detalhes do Google Maps.
+
+Com SCRAPER_CAPTURE ligado, o scraper guarda o HTML do painel de detalhes
+de cada resultado em SNAPSHOT_DIR, comprimido e endereçado pelo SHA-256 do
+conteúdo (páginas idênticas ocupam um arquivo só), e registra um
+PageSnapshot ligado ao ScrapingSession.
+
+O replay roda a extração (extraction.py) sobre os snapshots com o parser
+HTML da stdlib, em paralelo entre os núcleos, sem navegador. Serve para
+validar uma correção de seletor e reaplicá-la aos negócios já salvos.
+
+Uso: python snapshots.py [--session ID] [--limit N] [--apply]
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from models import Business, PageSnapshot, SessionLocal, init_db
+from config import get_config
+from log_config import setup_logging
+from extraction import FIELDS, HtmlPage, extract_fields
+from suppression import normalize_phone
+from address_parser import parse_address
+
+logger = logging.getLogger(__name__)
+
+# Negócios atualizados por lote no --apply
+APPLY_BATCH_SIZE = 1000
+
+def snapshot_path(content_hash, snapshot_dir=None):
+    snapshot_dir = snapshot_dir or get_config().SNAPSHOT_DIR
+    return os.path.join(snapshot_dir, content_hash[:2], content_hash[2:4], f"{content_hash}.html.gz")
+
+def store_snapshot(html, snapshot_dir=None):
+    """Grava o HTML (se ainda não existir) e retorna hash e tamanho original"""
+    data = html.encode('utf-8')
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = snapshot_path(content_hash, snapshot_dir)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: nunca deixar um snapshot pela metade no endereço final
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=6))
+        os.replace(temp_path, path)
+
+    return {'content_hash': content_hash, 'size_bytes': len(data)}
+
+def load_snapshot(content_hash, snapshot_dir=None):
+    with gzip.open(snapshot_path(content_hash, snapshot_dir), 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def _extract_snapshot(args):
+    """Executado nos processos do pool: carrega, parseia e extrai um snapshot"""
+    content_hash, snapshot_dir = args
+    try:
+        return content_hash, extract_fields(HtmlPage(load_snapshot(content_hash, snapshot_dir))), None
+    except Exception as e:
+        return content_hash, None, str(e)
+
+def replay_snapshots(session_id=None, limit=None, workers=None, apply=False, chunksize=16):
+    """Re-extrai os snapshots e compara (ou aplica, com apply=True) com os negócios salvos"""
+    init_db()
+    config = get_config()
+    started = time.perf_counter()
+    db = SessionLocal()
+    stats = {
+        'snapshots': 0, 'extracted': 0, 'empty': 0, 'failed': 0, 'applied': 0,
+        'changed': Counter(), 'filled': Counter(), 'emptied': Counter()
+    }
+
+    try:
+        query = db.query(PageSnapshot.business_id, PageSnapshot.content_hash).order_by(PageSnapshot.captured_at, PageSnapshot.id)
+        if session_id:
+            query = query.filter(PageSnapshot.session_id == session_id)
+        if limit:
+            query = query.limit(limit)
+
+        # Snapshot mais recente de cada negócio; páginas idênticas são extraídas uma vez
+        snapshots = query.all()
+        latest = {row.business_id: row.content_hash for row in snapshots if row.business_id}
+        hashes = {row.content_hash for row in snapshots}
+        stats['snapshots'] = len(snapshots)
+
+        extracted = {}
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for content_hash, fields, error in executor.map(
+                _extract_snapshot, [(content_hash, config.SNAPSHOT_DIR) for content_hash in hashes], chunksize=chunksize
+            ):
+                if error:
+                    stats['failed'] += 1
+                    logger.warning(f"Falha no replay do snapshot {content_hash}: {error}")
+                elif fields is None:
+                    stats['empty'] += 1
+                else:
+                    stats['extracted'] += 1
+                    extracted[content_hash] = fields
+
+        business_ids = [business_id for business_id, content_hash in latest.items() if content_hash in extracted]
+        for start in range(0, len(business_ids), APPLY_BATCH_SIZE):
+            batch_ids = business_ids[start:start + APPLY_BATCH_SIZE]
+            mappings = []
+
+            for business in db.query(Business).filter(Business.id.in_(batch_ids)):
+                fields = extracted[latest[business.id]]
+                update = {}
+                for field in FIELDS:
+                    old, new = getattr(business, field), fields[field]
+                    if old == new or (not old and not new):
+                        continue
+                    if not old:
+                        stats['filled'][field] += 1
+                    elif not new:
+                        stats['emptied'][field] += 1
+                        continue  # nunca apagar dados existentes
+                    else:
+                        stats['changed'][field] += 1
+                    update[field] = new
+
+                if update:
+                    if 'phone' in update:
+                        update['phone_normalized'] = normalize_phone(update['phone'])
+                    if 'address' in update:
+                        update.update(parse_address(update['address']))
+                    mappings.append({'id': business.id, **update})
+
+            if apply and mappings:
+                db.bulk_update_mappings(Business, mappings)
+                db.commit()
+                stats['applied'] += len(mappings)
+
+        if stats['applied']:
+            from lead_scoring import rescore_leads
+            rescore_leads()
+
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+        for key in ('changed', 'filled', 'emptied'):
+            stats[key] = dict(stats[key])
+        logger.info(f"Replay concluído: {stats}")
+        return {'success': True, **stats}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro no replay de snapshots: {str(e)}")
+        return {'success': False, 'error': str(e)}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Re-extrai dados dos snapshots capturados, sem navegador')
+    parser.add_argument('--session', type=int, help='apenas snapshots deste ScrapingSession')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--apply', action='store_true', help='gravar os campos alterados nos negócios')
+    args = parser.parse_args()
+    print(f"Resultado: {replay_snapshots(args.session, args.limit, args.workers, args.apply)}")
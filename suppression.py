@@ -0,0 +1,126 @@
+
+import csv
+import io
+import logging
+from models import Business, SuppressedPhone, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do lote para inserções e backfill
+BATCH_SIZE = 1000
+
+def normalize_phone(phone):
+    """Normaliza telefone para somente dígitos com código do país (55)"""
+    if not phone:
+        return None
+
+    clean_phone = ''.join(filter(str.isdigit, str(phone)))
+    if not clean_phone:
+        return None
+
+    # Adicionar código do país se não tiver
+    if not clean_phone.startswith('55'):
+        clean_phone = '55' + clean_phone
+
+    return clean_phone
+
+def load_suppressed_phones(db):
+    """Carrega a lista de supressão em memória para checagem O(1)"""
+    return {row[0] for row in db.query(SuppressedPhone.phone).yield_per(BATCH_SIZE)}
+
+def is_suppressed(db, phone):
+    """Verifica um único telefone na lista de supressão (consulta indexada)"""
+    normalized = normalize_phone(phone)
+    if not normalized:
+        return False
+    return db.query(SuppressedPhone.id).filter(SuppressedPhone.phone == normalized).first() is not None
+
+def suppress_phones(phones, reason=None, db=None):
+    """Adiciona telefones à lista de supressão, ignorando duplicados"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        normalized = {normalize_phone(phone) for phone in phones}
+        normalized.discard(None)
+
+        existing = set()
+        pending = list(normalized)
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            existing.update(
+                row[0] for row in db.query(SuppressedPhone.phone).filter(SuppressedPhone.phone.in_(chunk))
+            )
+
+        new_phones = sorted(normalized - existing)
+        for start in range(0, len(new_phones), BATCH_SIZE):
+            chunk = new_phones[start:start + BATCH_SIZE]
+            db.bulk_insert_mappings(SuppressedPhone, [{'phone': phone, 'reason': reason} for phone in chunk])
+            db.commit()
+
+        logger.info(f"Supressão: {len(new_phones)} novos, {len(existing)} já existentes")
+        return {'added': len(new_phones), 'already_suppressed': len(existing)}
+
+    finally:
+        if own_session:
+            db.close()
+
+def import_suppression_csv(stream, reason=None):
+    """Importa CSV de supressão (coluna 'phone'/'telefone' ou primeira coluna)"""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.StringIO(stream.decode('utf-8-sig'))
+    elif not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+
+    reader = csv.reader(stream)
+    phones = []
+    phone_column = 0
+
+    for i, row in enumerate(reader):
+        if not row:
+            continue
+        if i == 0:
+            header = [cell.strip().lower() for cell in row]
+            for name in ('phone', 'telefone', 'whatsapp'):
+                if name in header:
+                    phone_column = header.index(name)
+                    break
+            else:
+                # Sem cabeçalho reconhecido: primeira linha já é dado
+                phones.append(row[0])
+            continue
+        if len(row) > phone_column:
+            phones.append(row[phone_column])
+
+    return suppress_phones(phones, reason=reason)
+
+def backfill_normalized_phones():
+    """Preenche phone_normalized em negócios antigos"""
+    db = SessionLocal()
+    updated = 0
+    try:
+        while True:
+            rows = db.query(Business.id, Business.phone).filter(
+                Business.phone_normalized.is_(None),
+                Business.phone.isnot(None),
+                Business.phone != ''
+            ).limit(BATCH_SIZE).all()
+
+            if not rows:
+                break
+
+            mappings = [
+                {'id': row.id, 'phone_normalized': normalize_phone(row.phone) or ''}
+                for row in rows
+            ]
+            db.bulk_update_mappings(Business, mappings)
+            db.commit()
+            updated += len(mappings)
+
+        if updated:
+            logger.info(f"phone_normalized preenchido para {updated} negócios")
+        return updated
+
+    finally:
+        db.close()
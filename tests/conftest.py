@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Banco em memória (TestingConfig) e log fora do repositório, antes de importar os módulos
+os.environ['FLASK_ENV'] = 'testing'
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.mkdtemp(), 'app.log'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """data/ e export/ criados pelos módulos ficam no diretório temporário do teste"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    """Banco SQLite em arquivo, para código que usa sessões em outras threads"""
+    from sqlalchemy import create_engine
+    import models
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    original = models.SessionLocal.kw['bind']
+    monkeypatch.setattr(models, 'engine', engine)
+    models.SessionLocal.configure(bind=engine)
+    models.init_db()
+    yield engine
+    models.SessionLocal.configure(bind=original)
+    engine.dispose()
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+from app import app
+from models import Business, MessageLog, SessionLocal, init_db
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    init_db()
+    db = SessionLocal()
+    db.add_all([
+        Business(name='Padaria', phone='41999990000', category='Padaria'),
+        Business(name='Mercado', phone='41999990001', category='Mercado'),
+        MessageLog(business_id=1, business_name='Padaria', phone='41999990000',
+                   message_sent=True, sent_at=datetime.now()),
+    ])
+    db.commit()
+    db.close()
+    return app.test_client()
+
+def test_reports_page(client):
+    response = client.get('/reports')
+    assert response.status_code == 200
+    assert 'Padaria' in response.get_data(as_text=True)
@@ -0,0 +1,115 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+import scheduler
+from campaign import messaging_targets_query
+from models import Business, MessageLog, SessionLocal
+from scheduler import Campaign, CampaignDispatcher
+from whatsapp_service import ServiceWhatsAppSender, WhatsAppSessionService, make_handler
+
+class BlockingSender:
+    """Sender do serviço que só conclui o envio quando o teste libera"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.outcome = True
+
+    def login_whatsapp(self):
+        return True
+
+    def is_logged_in(self):
+        return True
+
+    def send_message_to_number(self, phone, message):
+        self.release.wait(10)
+        return self.outcome
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def service():
+    blocking = BlockingSender()
+    session_service = WhatsAppSessionService(sender_factory=lambda: blocking)
+    session_service.start()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(session_service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield blocking, f"http://127.0.0.1:{server.server_port}"
+    blocking.release.set()
+    server.shutdown()
+    server.server_close()
+
+def _add_business(name, phone):
+    db = SessionLocal()
+    business = Business(name=name, phone=phone)
+    db.add(business)
+    db.commit()
+    business_id = business.id
+    db.close()
+    return business_id
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def _pending_log(business_id):
+    db = SessionLocal()
+    try:
+        return db.query(MessageLog).filter(
+            MessageLog.business_id == business_id, MessageLog.pending_job_id.isnot(None)
+        ).first()
+    finally:
+        db.close()
+
+@pytest.mark.parametrize('outcome', [True, False])
+def test_service_send_settles_without_blocking_dispatcher(file_db, service, monkeypatch, outcome):
+    monkeypatch.setattr(scheduler, 'SETTLE_INTERVAL', 0.1)
+    blocking, url = service
+    blocking.outcome = outcome
+    slow_id = _add_business('Padaria', '41999990000')
+    other_id = _add_business('Mercado', '41999990001')
+
+    dispatcher = CampaignDispatcher(sender_factory=lambda: ServiceWhatsAppSender(url), close_sender_when_idle=False)
+    try:
+        slow = dispatcher.submit(Campaign([slow_id], messages_per_hour=3600))
+        assert _wait_for(lambda: _pending_log(slow_id) is not None)
+
+        # Outra campanha roda enquanto o envio da primeira está na fila do serviço
+        other = dispatcher.submit(Campaign([other_id], messages_per_hour=3600, test_mode=True))
+        assert other.done.wait(3)
+        assert other.results['successful_sends'] == 1
+        assert not slow.done.is_set()
+        assert slow.results['pending_sends'] == 1
+
+        # Pendente: fora dos alvos, mas sem last_contacted_at
+        db = SessionLocal()
+        try:
+            assert db.get(Business, slow_id).last_contacted_at is None
+            assert slow_id not in [business.id for business in messaging_targets_query(db)]
+        finally:
+            db.close()
+
+        blocking.release.set()
+        assert slow.done.wait(5)
+        assert slow.results['pending_sends'] == 0
+        assert slow.results['successful_sends' if outcome else 'failed_sends'] == 1
+
+        db = SessionLocal()
+        try:
+            log = db.query(MessageLog).filter_by(business_id=slow_id).one()
+            assert log.pending_job_id is None
+            assert log.message_sent is outcome
+            business = db.get(Business, slow_id)
+            assert (business.last_contacted_at is not None) is outcome
+            # Falha confirmada devolve o negócio aos alvos
+            eligible = slow_id in [business.id for business in messaging_targets_query(db)]
+            assert eligible is not outcome
+        finally:
+            db.close()
+    finally:
+        dispatcher.stop()
@@ -0,0 +1,47 @@
+from app import app
+from models import Business, SessionLocal, init_db
+from suppression import suppress_phones
+
+def _seed(businesses):
+    init_db()
+    db = SessionLocal()
+    db.add_all(businesses)
+    db.commit()
+    db.close()
+
+def test_dry_run_endpoint_applies_suppression_to_old_rows():
+    # Negócios antigos: phone_normalized ainda não preenchido
+    _seed([
+        Business(name='Suprimido', phone='(41) 99888-0000', category='Simulação Supressão'),
+        Business(name='Liberado', phone='(41) 99888-0001', category='Simulação Supressão'),
+    ])
+    suppress_phones(['41 99888-0000'], reason='pediu para sair')
+
+    response = app.test_client().post('/api/dry_run', json={
+        'category_filter': 'Simulação Supressão',
+        'output': 'table'
+    })
+
+    result = response.get_json()
+    assert result['success']
+    assert result['total_targets'] == 1
+    assert result['suppressed'] == 0
+
+def test_dry_run_endpoint_filters_old_rows_by_location():
+    # Negócios antigos: CEP/bairro ainda não separados do endereço
+    _seed([
+        Business(name='Batel', phone='(41) 99777-0000', category='Simulação Bairro',
+                 address='R. Comendador Araújo, 143 - Batel, Curitiba - PR, 80420-000'),
+        Business(name='Centro', phone='(41) 99777-0001', category='Simulação Bairro',
+                 address='R. XV de Novembro, 700 - Centro, Curitiba - PR, 80020-310'),
+    ])
+
+    response = app.test_client().post('/api/dry_run', json={
+        'category_filter': 'Simulação Bairro',
+        'location_filter': {'neighborhood': 'batel', 'cep': '80420'},
+        'output': 'table'
+    })
+
+    result = response.get_json()
+    assert result['success']
+    assert result['total_targets'] == 1
@@ -0,0 +1,102 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from enrichment import create_http_session, run_enrichment
+from models import Business, SessionLocal, init_db
+
+PAGES = {
+    '/contato': (200, 'text/html; charset=utf-8',
+                 '<a href="mailto:Contato@Padaria.com.br">e-mail</a>'
+                 '<a href="https://www.instagram.com/padaria_centro">ig</a>'
+                 '<a href="https://facebook.com/sharer.php">share</a>'
+                 '<a href="https://pt-br.facebook.com/padariacentro">fb</a>'),
+    '/charset': (200, 'text/html; charset=x-charset-inexistente',
+                 '<p>Fale conosco: vendas@mercado.com.br</p>'),
+    '/erro': (500, 'text/html', '<p>erro</p>'),
+}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        status, content_type, body = PAGES.get(self.path, (404, 'text/html', 'não encontrado'))
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stand_in_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.client_ports = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_run_enrichment_against_local_sites(stand_in_server):
+    base = f"127.0.0.1:{stand_in_server.server_port}"
+    init_db()
+    db = SessionLocal()
+    sites = {
+        'contato': Business(name='Padaria', website=f"{base}/contato"),
+        'charset': Business(name='Mercado', website=f"http://{base}/charset"),
+        'erro': Business(name='Oficina', website=f"http://{base}/erro",
+                         email='antigo@oficina.com.br', instagram='https://instagram.com/oficina'),
+        'ausente': Business(name='Loja', website=f"http://{base}/sumiu"),
+        'fora': Business(name='Bar', website=f"http://127.0.0.1:{_closed_port()}/"),
+    }
+    # Várias visitas ao mesmo host para exercitar o reaproveitamento de conexões
+    extra = [Business(name=f"Filial {index}", website=f"http://{base}/contato") for index in range(6)]
+    db.add_all([*sites.values(), *extra])
+    db.commit()
+    ids = {key: business.id for key, business in sites.items()}
+    db.close()
+
+    result = run_enrichment(concurrency=2, session=create_http_session(pool_size=2))
+    assert result['success']
+
+    db = SessionLocal()
+    try:
+        found = {key: db.get(Business, business_id) for key, business_id in ids.items()}
+
+        assert found['contato'].website_alive is True
+        assert found['contato'].email == 'contato@padaria.com.br'
+        assert found['contato'].instagram == 'https://instagram.com/padaria_centro'
+        assert found['contato'].facebook == 'https://facebook.com/padariacentro'
+
+        # Charset desconhecido não derruba o site
+        assert found['charset'].website_alive is True
+        assert found['charset'].email == 'vendas@mercado.com.br'
+
+        # Erro HTTP marca fora do ar sem apagar contatos anteriores
+        assert found['erro'].website_alive is False
+        assert found['erro'].website_status == 500
+        assert found['erro'].email == 'antigo@oficina.com.br'
+        assert found['erro'].instagram == 'https://instagram.com/oficina'
+
+        assert found['ausente'].website_alive is False
+        assert found['ausente'].website_status == 404
+
+        assert found['fora'].website_alive is False
+        assert found['fora'].website_status is None
+        assert all(business.enriched_at for business in found.values())
+    finally:
+        db.close()
+
+    # Pool de 2 conexões keep-alive para 10 visitas ao mesmo host
+    assert len(stand_in_server.client_ports) <= 2
@@ -0,0 +1,82 @@
+import io
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import Workbook
+
+import importer
+from importer import iter_csv_rows, iter_jsonl_rows, iter_xlsx_rows, normalize_row, parse_number
+
+def _normalize(rows):
+    return [normalize_row(row, 'teste', datetime.now()) for row in rows]
+
+@pytest.mark.parametrize('value, expected', [
+    (1234, 1234),
+    (1234.0, 1234.0),
+    ('1234', 1234),
+    ('1234.0', 1234),
+    ('1.234', 1234),
+    ('12.345.678', 12345678),
+    ('1.234,5', 1234.5),
+    ('4,5', 4.5),
+    ('4.5', 4.5),
+])
+def test_parse_number(value, expected):
+    assert parse_number(value) == expected
+
+def test_csv_reviews_pt_br():
+    data = 'nome;telefone;avaliação;número de avaliações\nPadaria;41999990000;4,5;1.234\nMercado;41999990001;4.8;87\n'
+    records = _normalize(iter_csv_rows(io.BytesIO(data.encode('utf-8'))))
+    assert [(r['rating'], r['reviews_count']) for r in records] == [(4.5, 1234), (4.8, 87)]
+
+def test_jsonl_numeric_values_pass_through():
+    lines = [
+        {'nome': 'Padaria', 'telefone': '41999990000', 'rating': 4.5, 'reviews': 1234.0},
+        {'nome': 'Mercado', 'telefone': '41999990001', 'rating': '4,8', 'reviews': '1.234'},
+    ]
+    data = '\n'.join(json.dumps(line) for line in lines).encode('utf-8')
+    records = _normalize(iter_jsonl_rows(io.BytesIO(data)))
+    assert [(r['rating'], r['reviews_count']) for r in records] == [(4.5, 1234), (4.8, 1234)]
+
+def test_xlsx_numeric_cells_pass_through():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Nome', 'Telefone', 'Avaliação', 'Número de avaliações'])
+    sheet.append(['Padaria', '41999990000', 4.5, 1234.0])
+    sheet.append(['Mercado', '41999990001', 4, '1.234'])
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+
+    records = _normalize(iter_xlsx_rows(stream))
+    assert [(r['rating'], r['reviews_count']) for r in records] == [(4.5, 1234), (4.0, 1234)]
+
+def test_invalid_reviews_rejected():
+    with pytest.raises(ValueError):
+        normalize_row({'name': 'Padaria', 'reviews_count': 'muitas'}, 'teste', datetime.now())
+
+class RecordingCursor:
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+class RecordingDb:
+    """Sessão falsa: db.connection().connection.cursor() devolve o cursor que grava o COPY"""
+    def __init__(self):
+        self.cursor = RecordingCursor()
+
+    def connection(self):
+        return SimpleNamespace(connection=SimpleNamespace(cursor=lambda: self.cursor))
+
+def test_copy_rows_keeps_empty_strings_apart_from_null():
+    db = RecordingDb()
+    record = normalize_row({'name': 'Padaria "Pão Quente"', 'phone': '41999990000',
+                            'address': 'Batel, Curitiba - PR'}, 'teste', datetime(2026, 1, 1))
+    assert record['cep'] == ''
+    columns = ['name', 'cep', 'rating', 'email', 'created_at']
+    importer._copy_rows(db, [record], columns)
+
+    assert "NULL '\\N'" in db.cursor.sql
+    assert db.cursor.data == '"Padaria ""Pão Quente""","",\\N,\\N,"2026-01-01 00:00:00"\n'
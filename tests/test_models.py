@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+import models
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Banco de uma versão anterior: businesses sem lead_score"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE businesses (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, phone VARCHAR(50))'))
+        conn.execute(text("INSERT INTO businesses (name, phone) VALUES ('Padaria', '41999990000'), ('Mercado', NULL)"))
+    monkeypatch.setattr(models, 'engine', engine)
+    yield engine
+    engine.dispose()
+
+def _updates_during(engine, action):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('UPDATE'):
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        action()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+def test_new_not_null_column_is_filled_by_its_default(legacy_db):
+    assert _updates_during(legacy_db, models.init_db) == []
+
+    with legacy_db.connect() as conn:
+        assert conn.execute(text('SELECT lead_score FROM businesses ORDER BY id')).scalars().all() == [0, 0]
+    indexes = {index['name'] for index in inspect(legacy_db).get_indexes('businesses')}
+    assert 'ix_businesses_lead_score_rank' in indexes
+
+def test_boot_does_not_rewrite_existing_rows(legacy_db):
+    models.init_db()
+    assert _updates_during(legacy_db, models.init_db) == []
@@ -0,0 +1,97 @@
+import json
+from fnmatch import fnmatch
+
+import pytest
+
+import scraper
+from scraper import LEAN_BLOCKED_URLS, GoogleMapsScraper, NetworkPayloadCollector
+
+SEARCH_URL = 'https://www.google.com/search?tbm=map&authuser=0&hl=pt-BR&pb=!4m12'
+
+def _place(index):
+    """Lugar no layout posicional da resposta de busca do Maps"""
+    place = [None] * 180
+    place[10] = f'0x94dce4:0x{index:x}'
+    place[11] = f'Padaria {index}'
+    place[39] = f'R. Comendador Araújo, {index} - Batel, Curitiba - PR, 80420-000'
+    place[13] = ['Padaria', 'Café']
+    place[4] = [None] * 7 + [4.5, 120 + index]
+    place[7] = [f'https://padaria{index}.com.br', f'padaria{index}.com.br']
+    place[178] = [[f'(41) 3333-{index:04d}', [None, [f'+55 41 3333-{index:04d}']]]]
+    return place
+
+def _search_response(indexes):
+    inner = ")]}'\n" + json.dumps([['padaria', [['meta']] + [[None] * 14 + [_place(i)] for i in indexes]]])
+    return json.dumps({'c': 0, 'd': inner, 'u': SEARCH_URL}) + '/*""*/'
+
+class FakeChrome:
+    """Chrome falso: registra comandos CDP e devolve uma busca gravada no log de performance"""
+    def __init__(self, service=None, options=None):
+        self.options = options
+        self.cdp_calls = []
+        self.performance_log = []
+        self.bodies = {}
+
+    def record_search(self, request_id, body):
+        self.bodies[request_id] = body
+        for method, params in (
+            ('Network.responseReceived', {'requestId': request_id, 'response': {'url': SEARCH_URL}}),
+            ('Network.loadingFinished', {'requestId': request_id}),
+        ):
+            self.performance_log.append({'message': json.dumps({'message': {'method': method, 'params': params}})})
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_calls.append((command, params))
+        if command == 'Network.getResponseBody':
+            return {'body': self.bodies[params['requestId']], 'base64Encoded': False}
+        return {}
+
+    def get_log(self, kind):
+        entries, self.performance_log = self.performance_log, []
+        return entries
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def quit(self):
+        pass
+
+class FakeDriverManager:
+    def install(self):
+        return '/usr/bin/chromedriver'
+
+@pytest.fixture
+def lean_network_scraper(monkeypatch):
+    monkeypatch.setattr(scraper.webdriver, 'Chrome', FakeChrome)
+    monkeypatch.setattr(scraper, 'ChromeDriverManager', FakeDriverManager)
+    instance = GoogleMapsScraper(browser_profile='lean', extraction_mode='network')
+    yield instance
+    instance.close()
+
+def test_lean_profile_enables_network_once_with_capture_buffers(lean_network_scraper):
+    calls = lean_network_scraper.driver.cdp_calls
+    enables = [params for command, params in calls if command == 'Network.enable']
+    assert len(enables) == 1
+    assert enables[0]['maxTotalBufferSize'] > 0 and enables[0]['maxResourceBufferSize'] > 0
+    assert [command for command, _ in calls] == ['Network.enable', 'Network.setBlockedURLs']
+    assert lean_network_scraper.driver.options.to_capabilities()['goog:loggingPrefs'] == {'performance': 'ALL'}
+
+def test_lean_profile_keeps_search_payload(lean_network_scraper):
+    assert not any(fnmatch(SEARCH_URL, pattern) for pattern in LEAN_BLOCKED_URLS)
+
+    driver = lean_network_scraper.driver
+    driver.record_search('r1', _search_response(range(3)))
+    places = NetworkPayloadCollector(driver).collect()
+
+    assert sorted(places) == [f'0x94dce4:0x{i:x}' for i in range(3)]
+    padaria = places['0x94dce4:0x1']
+    assert padaria['name'] == 'Padaria 1'
+    assert padaria['category'] == 'Padaria'
+    assert padaria['rating'] == 4.5
+    assert padaria['reviews_count'] == 121
+    assert padaria['website'] == 'https://padaria1.com.br'
+    assert padaria['address'].startswith('R. Comendador Araújo, 1')
+    assert '3333-0001' in padaria['phone']
@@ -0,0 +1,330 @@
+
+"""
+Serviço de sessão persistente do WhatsApp Web.
+
+Mantém um único Chrome logado entre campanhas e recebe envios por uma
+pequena API HTTP local:
+
+    GET  /health         estado da sessão e tamanho da fila
+    POST /send           {"phone": ..., "message": ..., "wait": true, "id": opcional}
+    GET  /jobs/<id>      resultado de um envio enfileirado
+
+Uso: python whatsapp_service.py
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import get_config
+from log_config import setup_logging, log_context
+from sender import WhatsAppSender
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de resultados de envio mantidos em memória
+MAX_JOB_HISTORY = 1000
+
+# Intervalo (segundos) entre consultas do cliente a /jobs/<id>
+JOB_POLL_INTERVAL = 2
+
+# Timeout (segundos) de cada consulta a /jobs/<id>: roda no ciclo do despachante
+JOB_STATUS_TIMEOUT = 5
+
+class WhatsAppSessionService:
+    def __init__(self, sender_factory=None, health_interval=60):
+        self.sender_factory = sender_factory or (lambda: WhatsAppSender(headless=False))
+        self.health_interval = health_interval
+        self.sender = None
+        self.jobs = queue.Queue()
+        self.history = OrderedDict()
+        self.lock = threading.Lock()
+        self.state = {
+            'logged_in': False,
+            'driver_alive': False,
+            'last_login_at': None,
+            'last_check_at': None,
+            'relogins': 0,
+            'sent': 0,
+            'failed': 0
+        }
+        self.worker = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def health(self):
+        with self.lock:
+            return {**self.state, 'queue_size': self.jobs.qsize()}
+
+    def enqueue(self, phone, message, job_id=None):
+        """Enfileira o envio; um id já conhecido devolve o job existente (reenvio do cliente)"""
+        job = {
+            'id': job_id or uuid.uuid4().hex,
+            'phone': phone,
+            'status': 'queued',
+            'success': None,
+            'error': None,
+            'created_at': datetime.now().isoformat(),
+            'done': threading.Event()
+        }
+        with self.lock:
+            if job['id'] in self.history:
+                return self.history[job['id']]
+            self.history[job['id']] = job
+            while len(self.history) > MAX_JOB_HISTORY:
+                self.history.popitem(last=False)
+        self.jobs.put((job, message))
+        return job
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.history.get(job_id)
+
+    def _run(self):
+        """Thread única que controla o driver (Selenium não é thread-safe)"""
+        self._ensure_session()
+        while True:
+            try:
+                job, message = self.jobs.get(timeout=self.health_interval)
+            except queue.Empty:
+                # Ocioso: verificar periodicamente se a sessão continua ativa
+                self._ensure_session()
+                continue
+
+            job['status'] = 'sending'
+            try:
+                with log_context(job_id=job['id']):
+                    if not self._ensure_session():
+                        job['success'] = False
+                        job['error'] = 'Sessão do WhatsApp não está logada'
+                    else:
+                        job['success'] = self.sender.send_message_to_number(job['phone'], message)
+                        if not job['success']:
+                            job['error'] = 'Falha no envio'
+            except Exception as e:
+                logger.error(f"Erro ao processar envio {job['id']}: {str(e)}")
+                job['success'] = False
+                job['error'] = str(e)
+                self._drop_driver()
+            finally:
+                job['status'] = 'done'
+                with self.lock:
+                    self.state['sent' if job['success'] else 'failed'] += 1
+                job['done'].set()
+
+    def _ensure_session(self):
+        """Garante driver vivo e logado, refazendo o login quando necessário"""
+        try:
+            if self.sender is None:
+                self.sender = self.sender_factory()
+                self._login()
+            elif not self.sender.is_logged_in():
+                logger.warning("Sessão do WhatsApp perdida. Refazendo login...")
+                with self.lock:
+                    self.state['relogins'] += 1
+                self._login()
+            else:
+                self._update_state(logged_in=True, driver_alive=True)
+        except Exception as e:
+            logger.error(f"Driver do WhatsApp indisponível: {str(e)}")
+            self._drop_driver()
+
+        return self.state['logged_in']
+
+    def _login(self):
+        logged_in = self.sender.login_whatsapp()
+        self._update_state(logged_in=logged_in, driver_alive=True)
+        if logged_in:
+            with self.lock:
+                self.state['last_login_at'] = datetime.now().isoformat()
+
+    def _drop_driver(self):
+        if self.sender:
+            try:
+                self.sender.close()
+            except Exception:
+                pass
+        self.sender = None
+        self._update_state(logged_in=False, driver_alive=False)
+
+    def _update_state(self, **values):
+        with self.lock:
+            self.state.update(values)
+            self.state['last_check_at'] = datetime.now().isoformat()
+
+    def close(self):
+        self._drop_driver()
+
+def _job_to_dict(job):
+    return {key: value for key, value in job.items() if key != 'done'}
+
+def make_handler(service):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                health = service.health()
+                self._reply(200 if health['logged_in'] else 503, health)
+            elif self.path.startswith('/jobs/'):
+                job = service.get_job(self.path[len('/jobs/'):])
+                if job:
+                    self._reply(200, _job_to_dict(job))
+                else:
+                    self._reply(404, {'error': 'Envio não encontrado'})
+            else:
+                self._reply(404, {'error': 'Rota não encontrada'})
+
+        def do_POST(self):
+            if self.path != '/send':
+                self._reply(404, {'error': 'Rota não encontrada'})
+                return
+
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._reply(400, {'error': 'JSON inválido'})
+                return
+
+            if not data.get('phone') or not data.get('message'):
+                self._reply(400, {'error': 'phone e message são obrigatórios'})
+                return
+
+            job = service.enqueue(data['phone'], data['message'], job_id=str(data.get('id') or '')[:32] or None)
+            if data.get('wait', True):
+                job['done'].wait(float(data.get('timeout', 120)))
+            self._reply(200, _job_to_dict(job))
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return ServiceHandler
+
+class ServiceWhatsAppSender(WhatsAppSender):
+    """Cliente do serviço: mesma interface do WhatsAppSender, sem abrir navegador
+
+    Nas campanhas o envio é só enfileirado (queue_message) e o despachante
+    confere o resultado em /jobs/<id> nos próximos ciclos, sem bloquear os
+    temporizadores das outras campanhas.
+    """
+    def __init__(self, service_url, timeout=30, send_timeout=None):
+        self.service_url = service_url.rstrip('/')
+        self.timeout = timeout
+        self.send_timeout = send_timeout or get_config().WHATSAPP_SEND_TIMEOUT
+        super().__init__(headless=False)
+
+    def setup_driver(self):
+        # O driver vive no processo do serviço
+        self.driver = None
+
+    def _request(self, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(
+            f"{self.service_url}{path}",
+            data=data,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read() or b'{}')
+
+    def login_whatsapp(self):
+        """Apenas consulta o health check; o login é feito pelo serviço"""
+        try:
+            health = self._request('/health')
+            if not health.get('logged_in'):
+                logger.error("Serviço do WhatsApp ativo, mas sem sessão logada")
+            return bool(health.get('logged_in'))
+        except Exception as e:
+            logger.error(f"Serviço do WhatsApp indisponível: {str(e)}")
+            return False
+
+    def is_logged_in(self):
+        return self.login_whatsapp()
+
+    def queue_message(self, phone, message):
+        """Enfileira o envio no serviço e retorna sem esperar; o resultado vem de get_job
+
+        O id do job é gerado aqui: se a resposta se perder depois de o serviço
+        enfileirar, o envio continua rastreável (e um reenvio com o mesmo id
+        não duplica a mensagem).
+        """
+        job_id = uuid.uuid4().hex
+        try:
+            job = self._request('/send', {'id': job_id, 'phone': phone, 'message': message, 'wait': False})
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, ConnectionRefusedError):
+                # Serviço fora do ar: nada foi enfileirado
+                logger.error(f"Serviço do WhatsApp indisponível ao enviar para {phone}: {str(e)}")
+                return {'id': job_id, 'status': 'done', 'success': False, 'error': 'Serviço do WhatsApp indisponível'}
+            logger.warning(f"Envio {job_id} para {phone} sem resposta do serviço: {str(e)}")
+            return {'id': job_id, 'status': 'queued', 'success': None, 'error': None}
+        except Exception as e:
+            logger.warning(f"Envio {job_id} para {phone} sem resposta do serviço: {str(e)}")
+            return {'id': job_id, 'status': 'queued', 'success': None, 'error': None}
+
+        if not job.get('id'):
+            logger.error(f"Erro ao enviar mensagem para {phone}: {job.get('error', 'resposta inválida')}")
+            return {'id': job_id, 'status': 'done', 'success': False, 'error': job.get('error', 'Resposta inválida')}
+        return job
+
+    def get_job(self, job_id):
+        """Consulta /jobs/<id> sem esperar; None se o serviço não responder ou não conhecer o job"""
+        try:
+            job = self._request(f"/jobs/{job_id}", timeout=JOB_STATUS_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Falha ao consultar envio {job_id}: {str(e)}")
+            return None
+        return job if job.get('id') else None
+
+    def send_message_to_number(self, phone, message):
+        """Envio avulso: enfileira e aguarda o resultado por até send_timeout"""
+        job = self.queue_message(phone, message)
+        deadline = time.monotonic() + self.send_timeout
+        while job.get('status') != 'done' and time.monotonic() < deadline:
+            time.sleep(JOB_POLL_INTERVAL)
+            job = self.get_job(job['id']) or job
+        return bool(job.get('success'))
+
+    def close(self):
+        pass
+
+def run_service(host=None, port=None):
+    """Inicia o serviço e bloqueia atendendo requisições"""
+    config = get_config()
+    host = host or config.WHATSAPP_SERVICE_HOST
+    port = port or config.WHATSAPP_SERVICE_PORT
+
+    service = WhatsAppSessionService(health_interval=config.WHATSAPP_HEALTH_INTERVAL)
+    service.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    logger.info(f"Serviço do WhatsApp ouvindo em http://{host}:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    setup_logging()
+    run_service()